@@ -0,0 +1 @@
+default_app_config = 'Apps.Blog.apps.BlogConfig'
@@ -0,0 +1,36 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.db.models import CharField, Func, Value
+
+logger = logging.getLogger(__name__)
+
+# emails are unique whatever their case. Users without an email ('', e.g. made by createsuperuser) are NULL for the
+# index, so any number of them is allowed.
+EMAIL_INDEX = 'auth_user_email_ci_uniq'
+EMAIL_INDEX_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS %s ON auth_user (LOWER(NULLIF(email, '')))" % EMAIL_INDEX
+
+
+class NormalizedEmail(Func):
+    """LOWER(NULLIF(email, '')), the expression of the email index. A lookup must use the very same expression for
+    the database to search the index instead of scanning the user table."""
+
+    template = "LOWER(NULLIF(%(expressions)s, ''))"
+    output_field = CharField()
+
+
+def email_taken(email):
+    """Whether a user has `email` in any case, with one search of the email index."""
+    return (User.objects.annotate(normalized_email=NormalizedEmail('email'))
+            .filter(normalized_email=NormalizedEmail(Value(email))).exists())
+
+
+def ensure_email_index():
+    # auth_user belongs to django.contrib.auth, so the index is created here instead of by a migration
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(EMAIL_INDEX_SQL)
+    except DatabaseError:
+        logger.warning('Could not create the unique email index %s, probably because some users share an email. '
+                       'Signups still check emails, but scan the user table to do so.', EMAIL_INDEX, exc_info=True)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Article, ArticleCategory, Comment
+from .models import Article, ArticleCategory, ArticleSlugRedirect, Comment
 
 
 @admin.register(ArticleCategory)
@@ -10,6 +10,17 @@ class ArticleCategoryAdmin(admin.ModelAdmin):
 
 class ArticleAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
+    list_display = ('name', 'published_by', 'word_count', 'reading_time', 'comment_count', 'views_count',
+                    'created_on')
+    readonly_fields = ('word_count', 'image_count', 'reading_time', 'comment_count', 'last_commented_on',
+                       'views_count')
+
+
+@admin.register(ArticleSlugRedirect)
+class ArticleSlugRedirectAdmin(admin.ModelAdmin):
+    list_display = ('old_slug', 'article', 'created_on')
+    raw_id_fields = ('article',)
+    search_fields = ('old_slug',)
 
 
 @admin.register(Comment)
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'Apps.Blog'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from modules import database  # noqa: F401
+        from modules.checks import assert_production_ready
+        assert_production_ready()
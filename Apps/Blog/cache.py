@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from modules.metrics import metrics
+
+from .models import ArticleCategory
+
+ARTICLE_CACHE_PREFIX = 'blog:article'
+ARTICLE_CACHE_HITS_KEY = 'blog:article-cache:hits'
+ARTICLE_CACHE_MISSES_KEY = 'blog:article-cache:misses'
+
+
+def article_cache_key(slug):
+    return '%s:%s' % (ARTICLE_CACHE_PREFIX, slug)
+
+
+def _incr(key):
+    # cache.incr is atomic on memcached/redis. add() only creates the counter when it is missing.
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def article_cache_version(article):
+    # comments change the payload without saving the article, their counters do change with them
+    last_commented_on = article.last_commented_on.timestamp() if article.last_commented_on else None
+    return article.updated_on.timestamp(), article.comment_count, last_commented_on
+
+
+def get_article_payload(article, build):
+    """Return the serialized payload of `article`, calling `build()` only on a cache miss. Entries are keyed by slug
+    and only served while they were built from the same version: `updated_on` and the comment counters. So a process
+    that never saw the write stops serving a stale entry as soon as the article row changes."""
+    key = article_cache_key(article.slug)
+    version = article_cache_version(article)
+    entry = cache.get(key)
+    if entry is not None and entry['version'] == version:
+        _incr(ARTICLE_CACHE_HITS_KEY)
+        metrics.inc('blog_cache_requests_total', cache='article', result='hit')
+        return entry['data'], True
+
+    _incr(ARTICLE_CACHE_MISSES_KEY)
+    metrics.inc('blog_cache_requests_total', cache='article', result='miss')
+    data = build()
+    cache.set(key, {'version': version, 'data': data}, settings.BLOG_ARTICLE_CACHE_TIMEOUT)
+    return data, False
+
+
+def invalidate_articles(*slugs):
+    if slugs:
+        cache.delete_many([article_cache_key(slug) for slug in slugs])
+
+
+def article_cache_stats():
+    hits = cache.get(ARTICLE_CACHE_HITS_KEY, 0)
+    misses = cache.get(ARTICLE_CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else 0.0}
+
+
+THROTTLED_PREFIX = 'blog:throttled'
+
+
+def count_throttled(scope):
+    _incr('%s:%s' % (THROTTLED_PREFIX, scope))
+    metrics.inc('blog_throttled_requests_total', scope=scope)
+
+
+def throttle_stats(scopes):
+    """Requests refused by the rate limits of every scope in `scopes`."""
+    counts = cache.get_many(['%s:%s' % (THROTTLED_PREFIX, scope) for scope in scopes])
+    return {scope: counts.get('%s:%s' % (THROTTLED_PREFIX, scope), 0) for scope in scopes}
+
+
+CATEGORY_VERSION_PREFIX = 'blog:category-version'
+CATEGORY_PAGE_PREFIX = 'blog:category-page'
+CATEGORY_SIDEBAR_KEY = 'blog:category-sidebar'
+
+
+def category_version(category_id):
+    key = '%s:%s' % (CATEGORY_VERSION_PREFIX, category_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def category_page_cache_key(category_id, cursor):
+    # the version is part of the key, so bumping it drops every cached page of the category at once
+    return '%s:%s:%s:%s' % (CATEGORY_PAGE_PREFIX, category_id, category_version(category_id), cursor or '')
+
+
+def invalidate_categories(*category_ids):
+    for category_id in category_ids:
+        _incr('%s:%s' % (CATEGORY_VERSION_PREFIX, category_id))
+    cache.delete(CATEGORY_SIDEBAR_KEY)
+
+
+def get_category_sidebar():
+    categories = cache.get(CATEGORY_SIDEBAR_KEY)
+    metrics.inc('blog_cache_requests_total', cache='category_sidebar', result='miss' if categories is None else 'hit')
+    if categories is None:
+        categories = list(ArticleCategory.objects.filter(article_count__gt=0).order_by('name')
+                          .values('name', 'slug', 'article_count'))
+        cache.set(CATEGORY_SIDEBAR_KEY, categories, settings.BLOG_CATEGORY_CACHE_TIMEOUT)
+    return categories
+
+
+FEED_ITEM_PREFIX = 'blog:feed-item'
+
+
+def feed_item_cache_key(feed, article_id, updated_on):
+    # a saved article gets a new key, its old fragments are never read again and just expire
+    return '%s:%s:%s:%s' % (FEED_ITEM_PREFIX, feed, article_id, updated_on.timestamp())
+
+
+def get_feed_items(feed, articles, render):
+    """Return the XML fragments of `articles`, (id, updated_on) pairs, in the same order. Only the ones missing from the
+    cache are rendered, with `render(ids)` returning {id: fragment}."""
+    keys = [feed_item_cache_key(feed, article_id, updated_on) for article_id, updated_on in articles]
+    fragments = cache.get_many(keys)
+    missing = [article_id for (article_id, updated_on), key in zip(articles, keys) if key not in fragments]
+    metrics.inc('blog_cache_requests_total', len(keys) - len(missing), cache='feed_item', result='hit')
+    metrics.inc('blog_cache_requests_total', len(missing), cache='feed_item', result='miss')
+    if missing:
+        rendered = render(missing)
+        fresh = {key: rendered[article_id] for (article_id, updated_on), key in zip(articles, keys)
+                 if article_id in rendered}
+        cache.set_many(fresh, settings.BLOG_FEED_CACHE_TIMEOUT)
+        fragments.update(fresh)
+    return [fragments[key] for key in keys if key in fragments]
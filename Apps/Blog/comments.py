@@ -0,0 +1,124 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+from .cache import invalidate_articles
+from .models import Article, Comment
+
+logger = logging.getLogger(__name__)
+
+
+class CommentWriteQueue:
+    """Write-behind buffer for comments. Comments are inserted with one bulk_create per batch by a background thread,
+    every `interval` seconds or as soon as `batch_size` are waiting, so a burst of comments on one article takes one
+    write lock instead of one per comment.
+
+    bulk_create doesn't send post_save, so the flush updates the comment counters and drops the cached articles
+    itself. Comments of articles deleted meanwhile are dropped, and a batch refused by a constraint is written one
+    comment at a time so a single bad row can't hold back the others. A batch failing for another reason, e.g. a
+    locked database, is kept for `retries` more flushes. At most `max_pending` comments wait, add() refuses more."""
+
+    def __init__(self, batch_size, interval, background=True, max_pending=10000, retries=5):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.background = background
+        self.max_pending = max_pending
+        self.retries = retries
+        # (comment, article slug, failed flushes)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, comment, article_slug):
+        """Queue `comment`, False when the queue is full and the caller should write it itself."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append((comment, article_slug, 0))
+            due = len(self._pending) >= self.batch_size
+        if self.background:
+            self._start()
+        if due:
+            self._wake.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _start(self):
+        # started on first use rather than on import, so every forked worker process gets its own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='comment-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        written = []
+        try:
+            existing = set(Article.objects.filter(pk__in={comment.article_id for comment, slug, failures in pending})
+                           .values_list('id', flat=True))
+            orphans = [entry for entry in pending if entry[0].article_id not in existing]
+            if orphans:
+                logger.warning('Dropping %s comments of deleted articles', len(orphans))
+                pending = [entry for entry in pending if entry[0].article_id in existing]
+            try:
+                written = self._write(pending)
+            except IntegrityError:
+                logger.warning('Writing %s comments one at a time', len(pending), exc_info=True)
+                for entry in pending:
+                    try:
+                        written += self._write([entry])
+                    except IntegrityError:
+                        comment = entry[0]
+                        logger.exception('Dropping the comment of %s on article %s', comment.comment_by_id,
+                                         comment.article_id)
+        except DatabaseError:
+            # keep the comments for the next flushes instead of losing them, but not forever
+            written_ids = {id(entry) for entry in written}
+            unwritten = [entry for entry in pending if id(entry) not in written_ids]
+            logger.exception('Could not write %s comments', len(unwritten))
+            kept = [(comment, slug, failures + 1) for comment, slug, failures in unwritten if failures < self.retries]
+            if len(kept) < len(unwritten):
+                logger.error('Dropping %s comments after %s failed writes', len(unwritten) - len(kept),
+                             self.retries + 1)
+            with self._lock:
+                self._pending[:0] = kept
+            connection.close()
+            return 0
+
+        invalidate_articles(*{slug for comment, slug, failures in written})
+        return len(written)
+
+    def _write(self, entries):
+        comments = [comment for comment, slug, failures in entries]
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+            per_article = defaultdict(list)
+            for comment in comments:
+                per_article[comment.article_id].append(comment.created_on)
+            for article_id, created_on in per_article.items():
+                Article.objects.record_comment(article_id, max(created_on), count=len(created_on))
+        return entries
+
+
+comment_queue = CommentWriteQueue(settings.BLOG_COMMENTS_WRITE_BATCH_SIZE, settings.BLOG_COMMENTS_WRITE_INTERVAL,
+                                  max_pending=settings.BLOG_COMMENTS_WRITE_MAX_PENDING,
+                                  retries=settings.BLOG_COMMENTS_WRITE_RETRIES)
+atexit.register(comment_queue.flush)
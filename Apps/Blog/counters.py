@@ -0,0 +1,112 @@
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+
+from .models import Article
+
+logger = logging.getLogger(__name__)
+
+BOT_USER_AGENT = re.compile(r'bot|crawl|spider|slurp|preview|monitor|curl|wget|python-requests|headless', re.I)
+
+
+class ViewCountBuffer:
+    """Collects article views in memory and writes them with one UPDATE per flush. Every worker process has its own
+    buffer and adds its counts to the column, so concurrent workers never overwrite each other.
+
+    A flush happens once `threshold` views are pending, and otherwise every `interval` seconds on a background thread,
+    so an idle worker doesn't sit on its views. Pending views belong to the database they were counted on: a flush
+    on another one, e.g. at exit after the test database was destroyed, drops them."""
+
+    def __init__(self, threshold, interval, background=True):
+        self.threshold = threshold
+        self.interval = interval
+        self.background = background
+        self._counts = Counter()
+        self._database = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, article_id):
+        with self._lock:
+            if not self._counts:
+                self._database = connection.settings_dict['NAME']
+            self._counts[article_id] += 1
+            due = sum(self._counts.values()) >= self.threshold
+        if self.background:
+            self._start()
+        if due:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return sum(self._counts.values())
+
+    def clear(self):
+        with self._lock:
+            self._counts = Counter()
+
+    def _start(self):
+        # started on first use rather than on import, so every forked worker process gets its own thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            # the thread only wakes up every `interval` seconds, it doesn't keep a connection open in between
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            database = self._database
+        if not counts:
+            return 0
+        if database != connection.settings_dict['NAME']:
+            logger.warning('Dropping %s article views counted on the database %s', sum(counts.values()), database)
+            return 0
+        try:
+            Article.objects.add_views(counts)
+        except DatabaseError:
+            # keep the views for the next flush instead of losing them
+            logger.exception('Could not flush %s article views', sum(counts.values()))
+            with self._lock:
+                if not self._counts:
+                    self._database = database
+                self._counts.update(counts)
+            return 0
+        return sum(counts.values())
+
+
+view_counts = ViewCountBuffer(settings.BLOG_VIEWS_FLUSH_THRESHOLD, settings.BLOG_VIEWS_FLUSH_INTERVAL)
+atexit.register(view_counts.flush)
+
+
+def count_article_view(request, article_id):
+    """Add a view of the article unless it comes from a bot or the same viewer saw it recently."""
+    if BOT_USER_AGENT.search(request.META.get('HTTP_USER_AGENT', '')):
+        return False
+
+    if request.session.session_key:
+        viewer = request.session.session_key
+    elif request.user.is_authenticated:
+        viewer = 'user-%s' % request.user.pk
+    else:
+        viewer = 'ip-%s' % request.META.get('REMOTE_ADDR')
+
+    # add() is a no-op when the key exists, so repeated views of the same viewer are dropped without a db query
+    if not cache.add('blog:viewed:%s:%s' % (viewer, article_id), 1, settings.BLOG_VIEWS_DEDUP_TIMEOUT):
+        return False
+    # a view seen by a transaction that rolls back (a test, a benchmark) is never counted
+    transaction.on_commit(lambda: view_counts.add(article_id))
+    return True
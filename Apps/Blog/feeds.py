@@ -0,0 +1,136 @@
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.feedgenerator import rfc2822_date, rfc3339_date
+from django.views.decorators.http import require_safe
+
+from modules.http import conditional_response, make_etag
+
+from .cache import get_feed_items
+from .models import Article
+
+RSS_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+    '<channel><title>{title}</title><link>{link}</link><description>{title}</description>'
+    '<atom:link href={self_link} rel="self"/><lastBuildDate>{updated}</lastBuildDate>'
+)
+RSS_ITEM = (
+    '<item><title>{title}</title><link>{link}</link><guid isPermaLink="true">{link}</guid>'
+    '<pubDate>{published}</pubDate><dc:creator>{author}</dc:creator>{categories}'
+    '<description>{summary}</description></item>'
+)
+RSS_FOOTER = '</channel></rss>'
+
+ATOM_HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom"><title>{title}</title><link href={link_attr}/>'
+    '<link href={self_link} rel="self"/><id>{link}</id><updated>{updated}</updated>'
+)
+ATOM_ITEM = (
+    '<entry><title>{title}</title><link href={link_attr}/><id>{link}</id><published>{published}</published>'
+    '<updated>{updated}</updated><author><name>{author}</name></author>{categories}'
+    '<summary type="html">{summary}</summary></entry>'
+)
+ATOM_FOOTER = '</feed>'
+
+FEEDS = {
+    'rss': (RSS_HEADER, RSS_ITEM, RSS_FOOTER, 'application/rss+xml; charset=utf-8', rfc2822_date),
+    'atom': (ATOM_HEADER, ATOM_ITEM, ATOM_FOOTER, 'application/atom+xml; charset=utf-8', rfc3339_date),
+}
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def render_feed_items(request, feed, updated_on):
+    """{id: item XML} of the articles in `updated_on`, {id: update time}."""
+    item, date = FEEDS[feed][1], FEEDS[feed][4]
+    items = {}
+    for article in Article.objects.for_listing().filter(id__in=list(updated_on)):
+        link = request.build_absolute_uri(article.get_absolute_url)
+        names = [category.name for category in article.category.all()]
+        if feed == 'rss':
+            categories = ''.join('<category>%s</category>' % escape(name) for name in names)
+        else:
+            categories = ''.join('<category term=%s/>' % quoteattr(name) for name in names)
+        items[article.id] = item.format(
+            title=escape(article.name), link=escape(link), link_attr=quoteattr(link),
+            published=date(article.created_on), updated=date(updated_on[article.id]),
+            author=escape(article.published_by.get_full_name() or article.published_by.username),
+            categories=categories, summary=escape(article.intro_excerpt),
+        )
+    return items
+
+
+@require_safe
+def article_feed(request, feed):
+    """RSS or Atom feed of the newest articles. One query reads the ids and update times of the articles, which answers
+    a conditional GET. The items are served from their cached fragments, only new or changed articles are rendered."""
+    if feed not in FEEDS:
+        raise Http404
+    header, item, footer, content_type, date = FEEDS[feed]
+    articles = list(Article.objects.select_related(None).prefetch_related(None)
+                    .order_by('-id').values_list('id', 'updated_on')[:settings.BLOG_FEED_SIZE])
+    updated = max((updated_on for article_id, updated_on in articles), default=None)
+
+    def build():
+        items = get_feed_items(feed, articles, lambda ids: render_feed_items(
+            request, feed, {article_id: updated_on for article_id, updated_on in articles if article_id in ids}))
+        link = request.build_absolute_uri(reverse('blogs_page'))
+        head = header.format(
+            title=escape(settings.BLOG_FEED_TITLE), link=escape(link), link_attr=quoteattr(link),
+            self_link=quoteattr(request.build_absolute_uri()), updated=date(updated) if updated else '',
+        )
+        return StreamingHttpResponse([head] + items + [footer], content_type=content_type)
+
+    etag = make_etag(feed, settings.BLOG_HTML_VERSION, articles)
+    return conditional_response(request, etag, updated, build)
+
+
+@require_safe
+def sitemap_index(request):
+    """Sitemap index with one sitemap per BLOG_SITEMAP_PAGE_SIZE article ids, so a page keeps its articles when new
+    ones are published. The pages and their last modification come from one grouped query."""
+    size = settings.BLOG_SITEMAP_PAGE_SIZE
+    pages = list(Article.objects.select_related(None).prefetch_related(None).order_by()
+                 .annotate(page=F('id') / size).values('page').annotate(updated=Max('updated_on'))
+                 .order_by('page').values_list('page', 'updated'))
+    updated = max((page_updated for page, page_updated in pages), default=None)
+
+    def build():
+        def lines():
+            yield '<?xml version="1.0" encoding="utf-8"?>\n<sitemapindex xmlns="%s">' % SITEMAP_NAMESPACE
+            for page, page_updated in pages:
+                location = request.build_absolute_uri(reverse('sitemap_page', kwargs={'page': page}))
+                yield '<sitemap><loc>%s</loc><lastmod>%s</lastmod></sitemap>' % (escape(location),
+                                                                                 rfc3339_date(page_updated))
+            yield '</sitemapindex>'
+        return StreamingHttpResponse(lines(), content_type='application/xml; charset=utf-8')
+
+    return conditional_response(request, make_etag('sitemap', size, pages), updated, build)
+
+
+@require_safe
+def sitemap_page(request, page):
+    """The articles of one sitemap page, streamed from the database without loading their bodies."""
+    size = settings.BLOG_SITEMAP_PAGE_SIZE
+    articles = (Article.objects.select_related(None).prefetch_related(None)
+                .filter(id__gte=page * size, id__lt=(page + 1) * size))
+    state = articles.order_by().aggregate(updated=Max('updated_on'), count=Count('id'))
+    if state['updated'] is None:
+        raise Http404
+
+    def build():
+        def lines():
+            yield '<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="%s">' % SITEMAP_NAMESPACE
+            for slug, updated_on in articles.order_by('id').values_list('slug', 'updated_on').iterator():
+                location = request.build_absolute_uri(reverse('blog_view', kwargs={'blog_slug': slug}))
+                yield '<url><loc>%s</loc><lastmod>%s</lastmod></url>' % (escape(location), rfc3339_date(updated_on))
+            yield '</urlset>'
+        return StreamingHttpResponse(lines(), content_type='application/xml; charset=utf-8')
+
+    etag = make_etag('sitemap', size, page, state['updated'], state['count'])
+    return conditional_response(request, etag, state['updated'], build)
@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm as BaseUserCreationForm
-from django.contrib.auth.models import User
 
+from .accounts import email_taken
 from .models import Article, ArticleCategory
 
 
@@ -16,7 +16,8 @@ class UserCreationForm(BaseUserCreationForm):
         return user
 
     def clean_email(self):
-        if User.objects.filter(email=self.cleaned_data['email']).exists():
+        # case insensitive like the unique email index, which also catches two signups racing for the same email
+        if email_taken(self.cleaned_data['email']):
             raise forms.ValidationError("This email already exists")
         return self.cleaned_data['email']
 
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from Apps.Blog.cache import invalidate_articles
+from Apps.Blog.models import Article
+from modules.utils import html_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Calculate word count, image count, reading time and intro excerpt of existing articles in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of articles loaded and updated per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (Article.objects.select_related(None).prefetch_related(None)
+                    .only('id', 'slug', 'blog', 'intro').order_by('id'))
+
+        last_id, updated = 0, 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for article in batch:
+                article.update_content_stats()
+                article.intro_excerpt = html_excerpt(article.intro)
+            Article.objects.bulk_update(batch, Article.CONTENT_STATS_FIELDS + ['intro_excerpt'])
+            # bulk_update sends no signals, cached pages of the batch are dropped here
+            invalidate_articles(*[article.slug for article in batch])
+            last_id = batch[-1].id
+            updated += len(batch)
+            self.stdout.write('Updated %s articles' % updated)
+
+        self.stdout.write(self.style.SUCCESS('Done. %s articles updated.' % updated))
@@ -0,0 +1,59 @@
+import timeit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Apps.Blog.models import Article, Comment
+from Apps.Blog.serializers import (
+    ArticleReadSerializer, CommentReadSerializer, COMMENT_READ_VALUES, article_read_data, comment_read_data
+)
+
+
+class Command(BaseCommand):
+    help = ('Compare the DRF read serializers with the plain dict read path on articles with 10, 1k and 10k comments. '
+            'The data is created in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000],
+                            help='Comment counts to benchmark.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per measurement, the fastest one is reported.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user('benchmark-serializers', first_name='Bench', last_name='Mark')
+            for size in options['sizes']:
+                article = Article.objects.create(name='Benchmark %s' % size, slug='benchmark-serializers-%s' % size,
+                                                 intro='Benchmark', blog='<p>Benchmark</p>', published_by=user)
+                Comment.objects.bulk_create(
+                    [Comment(article=article, comment_by=user, comment='Comment %s' % i) for i in range(size)],
+                    batch_size=500
+                )
+                self.benchmark(article, size, options['repeat'])
+            transaction.set_rollback(True)
+
+    def measure(self, function, repeat):
+        return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+    def benchmark(self, article, size, repeat):
+        comments = Comment.objects.filter(article=article).order_by('-created_on', '-id')
+        article = Article.objects.get(pk=article.pk)
+
+        drf = CommentReadSerializer(comments, many=True).data
+        fast = comment_read_data(comments.values(*COMMENT_READ_VALUES))
+        if drf != fast:
+            raise CommandError('Comment output differs at %s comments' % size)
+        if ArticleReadSerializer(article).data != article_read_data(article):
+            raise CommandError('Article output differs at %s comments' % size)
+
+        # .all() runs the query again on every call, like the values() queryset does
+        timings = [
+            ('comments', self.measure(lambda: CommentReadSerializer(comments.all(), many=True).data, repeat),
+             self.measure(lambda: comment_read_data(comments.values(*COMMENT_READ_VALUES)), repeat)),
+            ('article', self.measure(lambda: ArticleReadSerializer(article).data, repeat),
+             self.measure(lambda: article_read_data(article), repeat)),
+        ]
+        for name, drf_ms, fast_ms in timings:
+            self.stdout.write('%6s comments | %-8s | drf %9.2f ms | fast %9.2f ms | %5.1fx' % (
+                size, name, drf_ms, fast_ms, drf_ms / fast_ms if fast_ms else 0))
@@ -0,0 +1,195 @@
+import asyncio
+import json
+import os
+import shlex
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from Apps.Blog.models import Article
+
+from .benchmark_views import percentile
+
+SERVERS = {
+    'wsgi': 'gunicorn config.wsgi:application --workers {workers} --bind {host}:{port}',
+    'asgi': 'uvicorn config.asgi:application --workers {workers} --host {host} --port {port} --log-level warning',
+}
+
+
+class Command(BaseCommand):
+    help = ('Start the project under a WSGI and an ASGI server in turn and measure the requests per second and latency '
+            'of clients reading the index, the article API and the comment JSON while many slow clients are '
+            'connected, all logged in as the author of the newest article. A slow client sends its request one line per --slow-interval and reads the response 1 KB per '
+            '--slow-interval. Run it with production settings on a database filled by `generate_blog_data`, e.g. '
+            'DJANGO_SETTINGS_MODULE=config.settings.production DJANGO_SECRET_KEY=benchmark '
+            'DJANGO_ALLOWED_HOSTS=localhost, after `collectstatic`. Daphne works as well: '
+            '--asgi "daphne -b {host} -p {port} config.asgi:application".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+        parser.add_argument('--wsgi', default=SERVERS['wsgi'], help='Command starting the WSGI server.')
+        parser.add_argument('--asgi', default=SERVERS['asgi'], help='Command starting the ASGI server.')
+        parser.add_argument('--workers', type=int, default=2, help='Server processes.')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--clients', type=int, default=10,
+                            help='Clients sending requests one after the other as fast as they are answered.')
+        parser.add_argument('--slow-clients', type=int, default=100)
+        parser.add_argument('--slow-interval', type=float, default=0.5,
+                            help='Seconds between two request lines or two reads of a slow client.')
+        parser.add_argument('--duration', type=float, default=15, help='Seconds measured per server.')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed.')
+        parser.add_argument('--output', default=None, help='JSON file to write the results to.')
+
+    def handle(self, *args, **options):
+        article = Article.objects.select_related('published_by').prefetch_related(None).order_by('-id').first()
+        if article is None:
+            raise CommandError('There are no articles, run `manage.py generate_blog_data` first.')
+        slug = article.slug
+        self.paths = [
+            reverse('index_page'),
+            reverse('api_blogs'),
+            reverse('api_blog', kwargs={'blog_slug': slug}),
+            reverse('api_comments', kwargs={'blog_slug': slug}),
+        ]
+        self.host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        # the APIs answer logged in users only
+        self.cookie = self.login(article.published_by)
+        self.options = options
+
+        results = {}
+        for server in options['servers']:
+            command = options[server].format(workers=options['workers'], host=options['host'], port=options['port'])
+            self.stdout.write('%s: %s' % (server, command))
+            with self.serve(command):
+                results[server] = asyncio.run(self.run())
+            self.report(server, results[server])
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'options': {key: options[key] for key in (
+                    'workers', 'clients', 'slow_clients', 'slow_interval', 'duration')}, 'results': results},
+                    file, indent=2)
+            self.stdout.write(self.style.SUCCESS('Saved %s' % options['output']))
+
+    def login(self, user):
+        """The session cookie of a new session of `user`, stored where the servers will look for it."""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return '%s=%s' % (settings.SESSION_COOKIE_NAME, session.session_key)
+
+    @contextmanager
+    def serve(self, command):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        try:
+            process = subprocess.Popen(shlex.split(command), cwd=settings.BASE_DIR, env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as error:
+            raise CommandError('Could not start `%s`: %s' % (command, error))
+        try:
+            address = (self.options['host'], self.options['port'])
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    socket.create_connection(address, timeout=1).close()
+                    break
+                except OSError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise CommandError('`%s` did not start listening on %s:%s' % ((command,) + address))
+                    time.sleep(0.2)
+            yield
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    async def run(self):
+        deadline = time.monotonic() + self.options['duration']
+        timings, statuses, slow = [], {}, []
+        clients = [self.fast_client(i, deadline, timings, statuses) for i in range(self.options['clients'])]
+        clients += [self.slow_client(i, deadline, slow) for i in range(self.options['slow_clients'])]
+        await asyncio.gather(*clients)
+
+        timings.sort()
+        errors = sum(count for status, count in statuses.items() if status != 200)
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'statuses': statuses,
+            'requests_per_second': round(len(timings) / self.options['duration'], 1),
+            'p50_ms': round(percentile(timings, 50), 2) if timings else None,
+            'p95_ms': round(percentile(timings, 95), 2) if timings else None,
+            'p99_ms': round(percentile(timings, 99), 2) if timings else None,
+            'slow_requests': len(slow),
+        }
+
+    async def connect(self, receive_buffer=None):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if receive_buffer:
+            # a small buffer makes the server wait for the client instead of the kernel taking the whole response
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        sock.setblocking(False)
+        await asyncio.get_event_loop().sock_connect(sock, (self.options['host'], self.options['port']))
+        return await asyncio.open_connection(sock=sock)
+
+    def request_lines(self, path):
+        return ['GET %s HTTP/1.1\r\n' % path, 'Host: %s\r\n' % self.host, 'User-Agent: benchmark_servers\r\n',
+                'Accept: */*\r\n', 'Cookie: %s\r\n' % self.cookie, 'Connection: close\r\n', '\r\n']
+
+    async def fast_client(self, number, deadline, timings, statuses):
+        request = 0
+        while time.monotonic() < deadline:
+            path = self.paths[(number + request) % len(self.paths)]
+            request += 1
+            start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.wait_for(self.connect(), self.options['timeout'])
+                writer.write(''.join(self.request_lines(path)).encode('latin1'))
+                response = await asyncio.wait_for(reader.read(), self.options['timeout'])
+                writer.close()
+                status = int(response.split(b' ', 2)[1]) if response else 'empty'
+            except asyncio.TimeoutError:
+                status = 'timeout'
+            except (OSError, ValueError, IndexError):
+                status = 'error'
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                timings.append((time.perf_counter() - start) * 1000)
+
+    async def slow_client(self, number, deadline, slow):
+        interval = self.options['slow_interval']
+        # spread the connections over the first interval
+        await asyncio.sleep(interval * number / max(self.options['slow_clients'], 1))
+        while time.monotonic() < deadline:
+            try:
+                reader, writer = await self.connect(receive_buffer=4096)
+                for line in self.request_lines(self.paths[number % len(self.paths)]):
+                    writer.write(line.encode('latin1'))
+                    await writer.drain()
+                    await asyncio.sleep(interval)
+                while time.monotonic() < deadline:
+                    if not await reader.read(1024):
+                        slow.append(number)
+                        break
+                    await asyncio.sleep(interval)
+                writer.close()
+            except OSError:
+                await asyncio.sleep(interval)
+
+    def report(self, server, result):
+        self.stdout.write('%-5s %7.1f req/s | p50 %8.2f ms | p95 %8.2f ms | p99 %8.2f ms | %s errors | %s slow requests'
+                          % (server, result['requests_per_second'], result['p50_ms'] or 0, result['p95_ms'] or 0,
+                             result['p99_ms'] or 0, result['errors'], result['slow_requests']))
@@ -0,0 +1,90 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from Apps.Blog.models import Article
+from modules.queries import QueryBudget
+
+from .benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    help = ('Measure the latency and queries of authenticated page views with every session engine of '
+            'SESSION_ENGINES. A logged in user reads the blogs page and cached article pages through the Django test '
+            'client. Writes are rolled back and the cache is cleared before every engine.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Measured requests per session engine.')
+        parser.add_argument('--warmup', type=int, default=30,
+                            help='Requests per session engine run before measuring.')
+        parser.add_argument('--engines', nargs='+', choices=list(settings.SESSION_ENGINES),
+                            default=list(settings.SESSION_ENGINES))
+        parser.add_argument('--output', default=None, help='JSON file to write the results to.')
+
+    def handle(self, *args, **options):
+        articles = list(Article.objects.select_related(None).prefetch_related(None)
+                        .order_by('-id').values_list('slug', 'published_by')[:20])
+        if not articles:
+            raise CommandError('There are no articles, run `manage.py generate_blog_data` first.')
+        self.urls = [reverse('blogs_page')] + [reverse('blog_view', kwargs={'blog_slug': slug})
+                                               for slug, author in articles]
+        self.user = Article.objects.get(slug=articles[0][0]).published_by
+
+        results = {}
+        try:
+            for name in options['engines']:
+                cache.clear()
+                # the session middleware picks its engine when the client loads it, so every engine gets a client
+                with transaction.atomic(), override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[name]):
+                    results[name] = self.run(options['warmup'], options['requests'])
+                    transaction.set_rollback(True)
+                self.report(name, results[name])
+        finally:
+            cache.clear()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'requests': options['requests'], 'results': results}, file, indent=2)
+            self.stdout.write(self.style.SUCCESS('Saved %s' % options['output']))
+
+    def run(self, warmup, count):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        # an address outside INTERNAL_IPS, so the debug toolbar doesn't instrument the requests
+        client = Client(HTTP_HOST=host, REMOTE_ADDR='192.0.2.1')
+        client.force_login(self.user)
+
+        timings, queries, errors = [], 0, 0
+        for i in range(warmup + count):
+            with QueryBudget() as budget:
+                start = time.perf_counter()
+                response = client.get(self.urls[i % len(self.urls)])
+                elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries += budget.count
+            if response.status_code != 200:
+                errors += 1
+
+        timings.sort()
+        return {
+            'requests': count,
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / count, 2),
+            'queries_per_request': round(queries / count, 2),
+        }
+
+    def report(self, name, result):
+        self.stdout.write('%-14s p50 %7.2f ms | p95 %7.2f ms | p99 %7.2f ms | %5.2f queries | %s errors' % (
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries_per_request'],
+            result['errors']))
@@ -0,0 +1,185 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from Apps.Blog.models import Article, Comment
+from modules.queries import QueryBudget
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+SCENARIOS = ('blogs_page', 'blog_view', 'comment_add', 'blog_update')
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of sorted `values`."""
+    index = max(0, int(round(percent / 100 * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the blogs page, the article page, adding a comment and updating an article through the Django '
+            'test client and save p50/p95/p99 latency, throughput, queries and peak RSS as JSON. Run it on a database '
+            'filled by `generate_blog_data`. Writes are rolled back and the cache is cleared before and after.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20,
+                            help='Requests per scenario run before measuring.')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed, to request the same pages again.')
+        parser.add_argument('--output', default=None,
+                            help='JSON file to write, by default benchmarks/<time>-<commit>.json')
+        parser.add_argument('--compare', default=None,
+                            help='JSON file of an earlier run to print the differences with.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        articles = list(Article.objects.select_related(None).prefetch_related(None)
+                        .order_by('-id').values_list('slug', 'published_by')[:1000])
+        if not articles:
+            raise CommandError('There are no articles, run `manage.py generate_blog_data` first.')
+        self.slugs = [slug for slug, author in articles]
+        # the author of the newest article updates their own articles
+        self.author = articles[0][1]
+        self.own_slugs = [slug for slug, author in articles if author == self.author]
+
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        # requests from an address outside INTERNAL_IPS, so the debug toolbar doesn't instrument them
+        self.client = Client(HTTP_HOST=host, REMOTE_ADDR='192.0.2.1')
+
+        results = {}
+        cache.clear()
+        try:
+            # one client posting hundreds of comments would be rate limited after a few
+            with transaction.atomic(), override_settings(BLOG_THROTTLE_RATES={}):
+                self.client.force_login(Article.objects.get(slug=self.own_slugs[0]).published_by)
+                for scenario in options['scenarios']:
+                    results[scenario] = self.run_scenario(scenario, options['warmup'], options['requests'])
+                    self.report(scenario, results[scenario])
+                transaction.set_rollback(True)
+        finally:
+            cache.clear()
+
+        run = {
+            'commit': git_commit(),
+            'created_on': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'data': {'articles': Article.objects.count(), 'comments': Comment.objects.count()},
+            'requests': options['requests'],
+            'peak_rss_mb': peak_rss_mb(),
+            'results': results,
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', '%s-%s.json' % (datetime.now().strftime('%Y%m%d-%H%M%S'),
+                                                             (run['commit'] or 'unknown')[:8]))
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as file:
+            json.dump(run, file, indent=2)
+        self.stdout.write('Peak RSS %s MB' % run['peak_rss_mb'])
+        self.stdout.write(self.style.SUCCESS('Saved %s' % output))
+
+        if options['compare']:
+            self.compare(options['compare'], run)
+
+    # every scenario returns the method, url, data and expected status of its next request
+    def blogs_page(self):
+        sort = self.rng.choice(['latest', 'latest', 'discussed', 'active'])
+        return 'get', reverse('blogs_page'), {'sort': sort}, 200
+
+    def blog_view(self):
+        return 'get', reverse('blog_view', kwargs={'blog_slug': self.rng.choice(self.slugs)}), None, 200
+
+    def comment_add(self):
+        slug = self.rng.choice(self.slugs)
+        return 'post', reverse('comment_add', kwargs={'blog_slug': slug}), {'comment': 'Benchmark comment'}, 302
+
+    def blog_update(self):
+        slug = self.rng.choice(self.own_slugs)
+        article = Article.objects.get(slug=slug)
+        data = {
+            'name': article.name, 'intro': article.intro, 'blog': article.blog,
+            'category': [category.id for category in article.category.all()],
+        }
+        return 'post', reverse('blog_update', kwargs={'blog_slug': slug}), data, 302
+
+    def run_scenario(self, scenario, warmup, count):
+        next_request = getattr(self, scenario)
+        timings, queries, errors = [], 0, 0
+        for i in range(warmup + count):
+            method, url, data, status = next_request()
+            with QueryBudget() as budget:
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, data)
+                elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries += budget.count
+            if response.status_code != status:
+                errors += 1
+
+        timings.sort()
+        total = sum(timings)
+        return {
+            'requests': count,
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(total / count, 2),
+            'requests_per_second': round(count / total * 1000, 1),
+            'queries_per_request': round(queries / count, 1),
+        }
+
+    def report(self, scenario, result):
+        self.stdout.write('%-12s p50 %8.2f ms | p95 %8.2f ms | p99 %8.2f ms | %7.1f req/s | %4.1f queries | %s errors'
+                          % (scenario, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                             result['requests_per_second'], result['queries_per_request'], result['errors']))
+
+    def compare(self, path, run):
+        with open(path) as file:
+            previous = json.load(file)
+        self.stdout.write('Compared with %s (commit %s)' % (path, previous.get('commit')))
+        for scenario, result in run['results'].items():
+            before = previous['results'].get(scenario)
+            if not before:
+                continue
+            changes = ['%s %+.1f%%' % (key, (result[key] - before[key]) / before[key] * 100)
+                       for key in ('p50_ms', 'p95_ms', 'p99_ms', 'requests_per_second') if before[key]]
+            self.stdout.write('%-12s %s' % (scenario, ' | '.join(changes)))
@@ -0,0 +1,74 @@
+import gzip
+import json
+import sys
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from Apps.Blog.models import Article, ArticleCategory, Comment
+
+
+def open_ndjson(path, mode):
+    """`path` as a text file, gzip compressed when it ends with .gz. '-' is stdin or stdout."""
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts times to milliseconds, an import must get the exact ones back
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = ('Export users, categories, articles, their category links and comments as NDJSON, one record per line. '
+            'Rows are streamed from the database in chunks, so memory use doesn\'t grow with the amount of content. '
+            'Passwords are not exported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to write, compressed when it ends with .gz. '-' writes to stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        articles = Article.objects.select_related(None).prefetch_related(None).order_by('id')
+        # records reference each other by natural key (username, category slug, article slug), never by id. Every
+        # stream is (record type, record keys, values_list of the matching columns).
+        user_keys = ('username', 'first_name', 'last_name', 'email')
+        category_keys = ('name', 'slug')
+        streams = [
+            ('user', user_keys, User.objects.order_by('id').values_list(*user_keys)),
+            ('category', category_keys, ArticleCategory.objects.order_by('id').values_list(*category_keys)),
+            ('article', ('slug', 'name', 'intro', 'blog', 'wallpaper', 'created_on', 'updated_on', 'published_by'),
+             articles.values_list('slug', 'name', 'intro', 'blog', 'wallpaper', 'created_on', 'updated_on',
+                                  'published_by__username')),
+            ('article_category', ('article', 'category'),
+             Article.category.through.objects.order_by('id').values_list('article__slug', 'articlecategory__slug')),
+            ('comment', ('article', 'comment_by', 'comment', 'created_on', 'updated_on'),
+             Comment.objects.select_related(None).order_by('id').values_list(
+                 'article__slug', 'comment_by__username', 'comment', 'created_on', 'updated_on')),
+        ]
+
+        output = open_ndjson(options['path'], 'w')
+        counts = {}
+        try:
+            for record_type, keys, rows in streams:
+                counts[record_type] = 0
+                for row in rows.iterator(chunk_size=chunk_size):
+                    record = {'type': record_type, **dict(zip(keys, row))}
+                    output.write(json.dumps(record, cls=ExportEncoder, ensure_ascii=False) + '\n')
+                    counts[record_type] += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS('Done. Exported %s.' % ', '.join(
+            '%s %s records' % (count, record_type) for record_type, count in counts.items())))
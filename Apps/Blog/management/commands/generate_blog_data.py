@@ -0,0 +1,142 @@
+import random
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Apps.Blog.models import Article, ArticleCategory, Comment
+from modules.utils import create_slug
+
+WORDS = (
+    'django python query index cache article comment reader writer page server database request response template '
+    'model view serializer category search image upload latency memory thread worker deploy release feature test '
+    'performance scale traffic browser editor paragraph sentence story idea team design review code build network '
+    'storage backup system user session token queue batch report metric budget profile result value'
+).split()
+
+
+class Command(BaseCommand):
+    help = ('Generate users, categories, articles with Quill style HTML and comments with bulk inserts, to reproduce '
+            'production scale locally. Counters and the search index are rebuilt afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=20,
+                            help='Average number of comments per article.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows inserted per query.')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed, to generate the same content again.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 and options['articles']:
+            raise CommandError('Articles need at least one user to publish them.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # names are unique per run, so the command can be run again on the same database
+        self.run = uuid4().hex[:6]
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            categories = self.create_categories(options['categories'])
+            articles, comments = 0, 0
+            for start in range(0, options['articles'], self.batch_size):
+                count = min(self.batch_size, options['articles'] - start)
+                comments += self.create_articles(start, count, users, categories, options['comments'])
+                articles += count
+                self.stdout.write('Created %s articles, %s comments' % (articles, comments))
+
+        for command in ('reconcile_comment_counts', 'reconcile_category_counts', 'rebuild_search_index'):
+            call_command(command, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Done. %s users, %s categories, %s articles, %s comments created.' % (
+            len(users), len(categories), articles, comments)))
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def sentence(self):
+        return self.words(self.rng.randint(6, 18)).capitalize() + '.'
+
+    def paragraph(self):
+        sentences = [self.sentence() for _ in range(self.rng.randint(2, 6))]
+        if self.rng.random() < 0.4:
+            word = self.rng.choice(WORDS)
+            sentences.append(self.rng.choice(['<strong>%s</strong>', '<em>%s</em>', '<u>%s</u>']) % word)
+        return '<p>%s</p>' % ' '.join(sentences)
+
+    def quill_html(self):
+        """An article body shaped like the ones the Quill editor saves: paragraphs, headings, lists, quotes, code
+        blocks and images."""
+        blocks = []
+        for _ in range(self.rng.randint(4, 25)):
+            kind = self.rng.random()
+            if kind < 0.6:
+                blocks.append(self.paragraph())
+            elif kind < 0.7:
+                blocks.append('<h2>%s</h2>' % self.words(self.rng.randint(2, 6)).capitalize())
+            elif kind < 0.8:
+                tag = self.rng.choice(['ul', 'ol'])
+                items = ''.join('<li>%s</li>' % self.words(self.rng.randint(3, 10))
+                                for _ in range(self.rng.randint(2, 6)))
+                blocks.append('<%s>%s</%s>' % (tag, items, tag))
+            elif kind < 0.86:
+                blocks.append('<blockquote>%s</blockquote>' % self.sentence())
+            elif kind < 0.93:
+                lines = '\n'.join('%s = %s()' % (self.rng.choice(WORDS), self.rng.choice(WORDS))
+                                  for _ in range(self.rng.randint(2, 8)))
+                blocks.append('<pre class="ql-syntax" spellcheck="false">%s</pre>' % lines)
+            else:
+                blocks.append('<p><img src="https://picsum.photos/seed/%s/800/450"></p>' % self.rng.randint(1, 10 ** 6))
+        return ''.join(blocks)
+
+    def create_users(self, count):
+        # hashing a password is slow on purpose, every generated user shares one
+        password = make_password('password')
+        usernames = ['user-%s-%s' % (self.run, i) for i in range(count)]
+        User.objects.bulk_create([
+            User(username=username, email='%s@example.com' % username, password=password,
+                 first_name=self.rng.choice(WORDS).capitalize(), last_name=self.rng.choice(WORDS).capitalize())
+            for username in usernames
+        ], batch_size=self.batch_size)
+        return list(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+
+    def create_categories(self, count):
+        names = ['%s %s %s' % (self.rng.choice(WORDS).capitalize(), self.run, i) for i in range(count)]
+        ArticleCategory.objects.bulk_create([ArticleCategory(name=name, slug=create_slug(name)) for name in names],
+                                            batch_size=self.batch_size)
+        return list(ArticleCategory.objects.filter(name__in=names).values_list('id', flat=True))
+
+    def create_articles(self, start, count, users, categories, comments_per_article):
+        articles = []
+        for i in range(start, start + count):
+            name = self.words(self.rng.randint(3, 9)).capitalize()
+            article = Article(name=name, slug=create_slug(name, '%s-%s' % (self.run, i)),
+                              intro=' '.join(self.sentence() for _ in range(self.rng.randint(2, 4))),
+                              blog=self.quill_html(), published_by_id=self.rng.choice(users))
+            # bulk_create doesn't call save(), the derived columns are filled here
+            article.update_content_stats()
+            article.render_html()
+            articles.append(article)
+        Article.objects.bulk_create(articles)
+        ids = list(Article.objects.filter(slug__in=[article.slug for article in articles]).values_list('id', flat=True))
+
+        through = Article.category.through
+        through.objects.bulk_create([
+            through(article_id=article_id, articlecategory_id=category_id)
+            for article_id in ids
+            for category_id in self.rng.sample(categories, min(len(categories), self.rng.randint(1, 3)))
+        ], batch_size=self.batch_size)
+
+        comments = [
+            Comment(article_id=article_id, comment_by_id=self.rng.choice(users),
+                    comment=' '.join(self.sentence() for _ in range(self.rng.randint(1, 3))))
+            for article_id in ids
+            for _ in range(self.rng.randint(0, comments_per_article * 2))
+        ]
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+        return len(comments)
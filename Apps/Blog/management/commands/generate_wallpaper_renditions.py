@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from Apps.Blog.models import Article
+from Apps.Blog.renditions import run_rendition_job
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized renditions of article wallpapers that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerate the renditions of every wallpaper.')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of wallpapers processed at the same time.')
+
+    def handle(self, *args, **options):
+        queryset = Article.objects.select_related(None).prefetch_related(None).exclude(wallpaper='')
+        queryset = queryset.exclude(wallpaper__isnull=True)
+        if not options['all']:
+            queryset = queryset.exclude(wallpaper_renditions_for=F('wallpaper'))
+
+        done, failed = 0, 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [executor.submit(run_rendition_job, pk) for pk in queryset.values_list('id', flat=True)]
+            for future in as_completed(futures):
+                if future.exception():
+                    failed += 1
+                else:
+                    done += 1
+
+        self.stdout.write(self.style.SUCCESS('Done. %s wallpapers rendered, %s failed.' % (done, failed)))
@@ -0,0 +1,168 @@
+import json
+import sys
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from Apps.Blog.cache import invalidate_articles, invalidate_categories
+from Apps.Blog.models import Article, ArticleCategory, Comment
+
+from .export_articles import open_ndjson
+
+ARTICLE_FIELDS = ['name', 'intro', 'blog', 'wallpaper', 'created_on', 'updated_on', 'published_by_id']
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """Insert created_on/updated_on as given instead of the current time."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Import the NDJSON written by `export_articles`. The file is read line by line and every record type is '
+            'written in batches with bulk_create, so memory use doesn\'t grow with the number of comments. Articles '
+            'are matched by slug: existing ones are updated and get the categories of the file. Comments are only '
+            'imported for articles the import creates, so importing a file twice doesn\'t duplicate them. Missing '
+            'users are created without a usable password.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, compressed when it ends with .gz. '-' reads stdin.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of records written per query.')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.categories = dict(ArticleCategory.objects.values_list('slug', 'id'))
+        # slug -> id of the articles of this import, and the ids of the ones it created
+        self.articles, self.created_articles = {}, set()
+        self.counts = dict.fromkeys(['user', 'category', 'article', 'article_category', 'comment'], 0)
+        self.pending, self.pending_type = [], None
+
+        handlers = {
+            'user': self.import_users,
+            'category': self.import_categories,
+            'article': self.import_articles,
+            'article_category': self.import_links,
+            'comment': self.import_comments,
+        }
+        source = open_ndjson(options['path'], 'r')
+        try:
+            with transaction.atomic(), keep_timestamps(Article, Comment):
+                for number, line in enumerate(source, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        handler = handlers[record.pop('type')]
+                    except (ValueError, KeyError):
+                        raise CommandError('Line %s is not a record of export_articles' % number)
+                    # records of a type are batched, a batch is written before the records depending on it
+                    if self.pending_type not in (None, handler) or len(self.pending) >= self.batch_size:
+                        self.flush()
+                    self.pending.append(record)
+                    self.pending_type = handler
+                self.flush()
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        # bulk writes send no signals: counters, search index and caches are brought up to date here
+        for command in ('reconcile_comment_counts', 'reconcile_category_counts', 'rebuild_search_index'):
+            call_command(command, stdout=self.stderr)
+        invalidate_categories(*self.categories.values())
+        self.stderr.write(self.style.SUCCESS('Done. Imported %s.' % ', '.join(
+            '%s %s records' % (count, record_type) for record_type, count in self.counts.items())))
+
+    def flush(self):
+        if self.pending:
+            self.pending_type(self.pending)
+        self.pending = []
+
+    def import_users(self, records):
+        new = [User(username=record['username'], first_name=record['first_name'], last_name=record['last_name'],
+                    email=record['email'], password=make_password(None))
+               for record in records if record['username'] not in self.users]
+        User.objects.bulk_create(new)
+        self.users.update(User.objects.filter(username__in=[user.username for user in new])
+                          .values_list('username', 'id'))
+        self.counts['user'] += len(new)
+
+    def import_categories(self, records):
+        new = [ArticleCategory(name=record['name'], slug=record['slug'])
+               for record in records if record['slug'] not in self.categories]
+        ArticleCategory.objects.bulk_create(new)
+        self.categories.update(ArticleCategory.objects.filter(slug__in=[category.slug for category in new])
+                               .values_list('slug', 'id'))
+        self.counts['category'] += len(new)
+
+    def import_articles(self, records):
+        queryset = Article.objects.select_related(None).prefetch_related(None)
+        existing = dict(queryset.filter(slug__in=[record['slug'] for record in records]).values_list('slug', 'id'))
+        new, changed = [], []
+        for record in records:
+            if record['published_by'] not in self.users:
+                raise CommandError('Article %s is published by unknown user %s' % (record['slug'],
+                                                                                  record['published_by']))
+            article = Article(id=existing.get(record['slug']), slug=record['slug'], name=record['name'],
+                              intro=record['intro'], blog=record['blog'], wallpaper=record['wallpaper'] or '',
+                              created_on=parse_datetime(record['created_on']),
+                              updated_on=parse_datetime(record['updated_on']),
+                              published_by_id=self.users[record['published_by']])
+            # bulk writes don't call save(), the derived columns are filled here
+            article.update_content_stats()
+            article.render_html()
+            (changed if article.id else new).append(article)
+
+        Article.objects.bulk_create(new)
+        Article.objects.bulk_update(changed, ARTICLE_FIELDS + Article.CONTENT_STATS_FIELDS + Article.HTML_FIELDS)
+        # updated articles get the categories of the file, their links follow in article_category records
+        Article.category.through.objects.filter(article_id__in=[article.id for article in changed]).delete()
+        invalidate_articles(*[article.slug for article in changed])
+
+        created = dict(queryset.filter(slug__in=[article.slug for article in new]).values_list('slug', 'id'))
+        self.created_articles.update(created.values())
+        self.articles.update(created)
+        self.articles.update(existing)
+        self.counts['article'] += len(records)
+
+    def article_ids(self, slugs):
+        missing = set(slugs) - set(self.articles)
+        if missing:
+            self.articles.update(Article.objects.select_related(None).prefetch_related(None)
+                                 .filter(slug__in=missing).values_list('slug', 'id'))
+        return self.articles
+
+    def import_links(self, records):
+        articles = self.article_ids(record['article'] for record in records)
+        through = Article.category.through
+        links = [through(article_id=articles[record['article']], articlecategory_id=self.categories[record['category']])
+                 for record in records if record['article'] in articles and record['category'] in self.categories]
+        through.objects.bulk_create(links, ignore_conflicts=True)
+        self.counts['article_category'] += len(links)
+
+    def import_comments(self, records):
+        comments = []
+        for record in records:
+            article_id = self.articles.get(record['article'])
+            if article_id not in self.created_articles or record['comment_by'] not in self.users:
+                continue
+            comments.append(Comment(article_id=article_id, comment_by_id=self.users[record['comment_by']],
+                                    comment=record['comment'], created_on=parse_datetime(record['created_on']),
+                                    updated_on=parse_datetime(record['updated_on'])))
+        Comment.objects.bulk_create(comments)
+        self.counts['comment'] += len(comments)
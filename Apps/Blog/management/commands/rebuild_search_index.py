@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from Apps.Blog.models import Article
+from Apps.Blog.search import SEARCH_FIELDS, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the article search index, streaming articles from the database in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of articles loaded and indexed at a time.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        backend = get_search_backend()
+        backend.clear()
+
+        articles = (Article.objects.select_related(None).prefetch_related(None).only(*SEARCH_FIELDS)
+                    .order_by('id').iterator(chunk_size=chunk_size))
+        chunk, indexed = [], 0
+        for article in articles:
+            chunk.append(article)
+            if len(chunk) == chunk_size:
+                backend.index(chunk)
+                indexed += len(chunk)
+                chunk = []
+                self.stdout.write('Indexed %s articles' % indexed)
+        if chunk:
+            backend.index(chunk)
+            indexed += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS('Done. %s articles indexed.' % indexed))
@@ -0,0 +1,25 @@
+from django.db.models import Count
+from django.core.management.base import BaseCommand
+
+from Apps.Blog.cache import invalidate_categories
+from Apps.Blog.models import Article, ArticleCategory
+
+
+class Command(BaseCommand):
+    help = 'Recalculate the article count of every category and fix the ones that drifted.'
+
+    def handle(self, *args, **options):
+        through = Article.category.through
+        counts = dict(through.objects.values_list('articlecategory').annotate(count=Count('article')).order_by())
+
+        drifted = []
+        for category in ArticleCategory.objects.only('id', 'article_count'):
+            count = counts.get(category.id, 0)
+            if category.article_count != count:
+                category.article_count = count
+                drifted.append(category)
+        if drifted:
+            ArticleCategory.objects.bulk_update(drifted, ['article_count'])
+            invalidate_categories(*[category.id for category in drifted])
+
+        self.stdout.write(self.style.SUCCESS('Done. %s categories fixed.' % len(drifted)))
@@ -0,0 +1,41 @@
+from django.db.models import Count, Max
+from django.core.management.base import BaseCommand
+
+from Apps.Blog.models import Article, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recalculate comment count and last comment time of articles and fix the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of articles checked per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (Article.objects.select_related(None).prefetch_related(None)
+                    .only('id', 'comment_count', 'last_commented_on').order_by('id'))
+
+        last_id, checked, fixed = 0, 0, 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            stats = {
+                row['article']: (row['count'], row['latest'])
+                for row in Comment.objects.filter(article__in=[article.id for article in batch])
+                .order_by().values('article').annotate(count=Count('id'), latest=Max('created_on'))
+            }
+            drifted = []
+            for article in batch:
+                count, latest = stats.get(article.id, (0, None))
+                if (article.comment_count, article.last_commented_on) != (count, latest):
+                    article.comment_count, article.last_commented_on = count, latest
+                    drifted.append(article)
+            if drifted:
+                Article.objects.bulk_update(drifted, ['comment_count', 'last_commented_on'])
+            last_id = batch[-1].id
+            checked += len(batch)
+            fixed += len(drifted)
+
+        self.stdout.write(self.style.SUCCESS('Done. %s articles checked, %s fixed.' % (checked, fixed)))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Apps.Blog.cache import invalidate_articles
+from Apps.Blog.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Sanitize the blog body and intro of articles rendered with an older BLOG_HTML_VERSION again, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of articles loaded and updated per query.')
+        parser.add_argument('--all', action='store_true',
+                            help='Render every article, not only the outdated ones.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (Article.objects.select_related(None).prefetch_related(None)
+                    .only('id', 'slug', 'blog', 'intro', 'html_version').order_by('id'))
+        if not options['all']:
+            queryset = queryset.exclude(html_version=settings.BLOG_HTML_VERSION)
+
+        last_id, rendered = 0, 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for article in batch:
+                article.render_html()
+            Article.objects.bulk_update(batch, Article.HTML_FIELDS)
+            # bulk_update sends no signals, cached pages of the batch are dropped here
+            invalidate_articles(*[article.slug for article in batch])
+            last_id = batch[-1].id
+            rendered += len(batch)
+            self.stdout.write('Rendered %s articles' % rendered)
+
+        self.stdout.write(self.style.SUCCESS('Done. %s articles rendered with version %s.' % (
+            rendered, settings.BLOG_HTML_VERSION)))
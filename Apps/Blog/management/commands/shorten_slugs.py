@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from Apps.Blog.cache import invalidate_articles
+from Apps.Blog.models import Article, ArticleSlugRedirect
+
+# slugs of articles created before short slugs end with a uuid4
+UUID_SUFFIX = r'-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+
+
+class Command(BaseCommand):
+    help = ('Give articles whose slug ends with a uuid or is longer than --max-length a short slug, in batches. The '
+            'old slugs are kept as redirects, so existing links keep working.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of articles loaded and updated per query.')
+        parser.add_argument('--max-length', type=int, default=50,
+                            help='Slugs longer than this are shortened too.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (Article.objects.select_related(None).prefetch_related(None).only('id', 'name', 'slug')
+                    .annotate(slug_length=Length('slug'))
+                    .filter(Q(slug__regex=UUID_SUFFIX) | Q(slug_length__gt=options['max_length'])).order_by('id'))
+
+        last_id, shortened = 0, 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            redirects, reserved = [], set()
+            for article in batch:
+                redirects.append(ArticleSlugRedirect(old_slug=article.slug, article_id=article.id))
+                # slugs given earlier in the batch are not saved yet
+                article.slug = Article.objects.unique_slug(article.name, reserved=reserved)
+                reserved.add(article.slug)
+            with transaction.atomic():
+                Article.objects.bulk_update(batch, ['slug'])
+                ArticleSlugRedirect.objects.bulk_create(redirects)
+            # bulk writes send no signals, cached pages of the old slugs are dropped here
+            invalidate_articles(*[redirect.old_slug for redirect in redirects])
+            last_id = batch[-1].id
+            shortened += len(batch)
+            self.stdout.write('Shortened %s slugs' % shortened)
+
+        self.stdout.write(self.style.SUCCESS('Done. %s slugs shortened.' % shortened))
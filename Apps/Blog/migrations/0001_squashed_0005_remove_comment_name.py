@@ -0,0 +1,81 @@
+# The schema the blog was deployed with before it shipped its migrations. Databases made by the original migrations
+# 0001-0005, which were never part of the repository, have it already and skip this one.
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import modules.utils
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('Blog', '0001_initial'),
+        ('Blog', '0002_auto_20200228_1611'),
+        ('Blog', '0003_auto_20200228_1646'),
+        ('Blog', '0004_auto_20200228_1801'),
+        ('Blog', '0005_remove_comment_name'),
+    ]
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleCategory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='this field will be used as name for models inheriting from this model', max_length=255, verbose_name='name')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created on')),
+                ('updated_on', models.DateTimeField(auto_now=True, verbose_name='updated on')),
+                ('slug', models.SlugField(blank=True, verbose_name='slug')),
+            ],
+            options={
+                'verbose_name': 'Category',
+                'verbose_name_plural': 'Categories',
+                'db_table': 'article_category',
+                'unique_together': {('name', 'slug')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Article',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='this field will be used as name for models inheriting from this model', max_length=255, verbose_name='name')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created on')),
+                ('updated_on', models.DateTimeField(auto_now=True, verbose_name='updated on')),
+                ('slug', models.CharField(db_index=True, help_text='slug of an article. It should be unique.', max_length=500, unique=True, verbose_name='slug')),
+                ('blog', models.TextField(blank=True, null=True)),
+                ('intro', models.TextField(help_text='Brief of your article in 50-60 words.', max_length=500, verbose_name='intro')),
+                ('wallpaper', models.ImageField(blank=True, help_text='wallpaper for the article. This image and its thumbnail will be used everywhere.', max_length=300, null=True, upload_to=modules.utils.generate_upload_path, verbose_name='wallpaper')),
+                ('category', models.ManyToManyField(db_index=True, help_text='Categories mentioned in the article.', related_name='category', to='Blog.ArticleCategory')),
+                ('published_by', models.ForeignKey(help_text='User who published the article.', on_delete=django.db.models.deletion.CASCADE, related_name='user', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Blogs',
+                'verbose_name_plural': 'Blog',
+                'db_table': 'articles',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created on')),
+                ('updated_on', models.DateTimeField(auto_now=True, verbose_name='updated on')),
+                ('comment', models.TextField(verbose_name='comment')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comment', to='Blog.Article')),
+                ('comment_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comment_by', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Comment',
+                'verbose_name_plural': 'Comments',
+                'db_table': 'comment',
+                'ordering': ['-created_on'],
+            },
+        ),
+    ]
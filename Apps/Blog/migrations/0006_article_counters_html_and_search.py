@@ -0,0 +1,147 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:03
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+import modules.storage
+import modules.utils
+
+
+def count_existing(apps, schema_editor):
+    # the counters are kept up to date by signals from now on, existing rows get theirs here. Stats, html, search
+    # tokens and renditions take the management commands listed in the README.
+    Article = apps.get_model('Blog', 'Article')
+    ArticleCategory = apps.get_model('Blog', 'ArticleCategory')
+    Comment = apps.get_model('Blog', 'Comment')
+    comments = Comment.objects.filter(article=OuterRef('pk')).order_by()
+    Article.objects.update(
+        comment_count=Coalesce(Subquery(comments.values('article').annotate(count=Count('id')).values('count')), 0),
+        last_commented_on=Subquery(comments.order_by('-created_on').values('created_on')[:1]),
+    )
+    links = Article.category.through.objects.filter(articlecategory=OuterRef('pk')).order_by()
+    ArticleCategory.objects.update(article_count=Coalesce(
+        Subquery(links.values('articlecategory').annotate(count=Count('id')).values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0001_squashed_0005_remove_comment_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='term')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='weight')),
+            ],
+            options={
+                'verbose_name': 'Search token',
+                'verbose_name_plural': 'Search tokens',
+                'db_table': 'article_search_token',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArticleSlugRedirect',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_slug', models.CharField(help_text='slug the article had before it was renamed.', max_length=500, unique=True, verbose_name='old slug')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created on')),
+            ],
+            options={
+                'verbose_name': 'Slug redirect',
+                'verbose_name_plural': 'Slug redirects',
+                'db_table': 'article_slug_redirect',
+            },
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='blog_html',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Sanitized blog body. Rendered from the blog on save.', verbose_name='blog html'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of comments on the article.', verbose_name='comment count'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='html_version',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, help_text='Whitelist version the html fields were rendered with.', verbose_name='html version'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='image_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Images in the article. Calculated from the blog body on save.', verbose_name='image count'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='intro_excerpt',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Sanitized intro cut to 60 words. Rendered from the intro on save.', verbose_name='intro excerpt'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='last_commented_on',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the article was last commented on.', null=True, verbose_name='last commented on'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(db_index=True, default=1, editable=False, help_text='Minutes needed to read the article. Calculated from the blog body on save.', verbose_name='reading time'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of times the article was viewed.', verbose_name='views count'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='wallpaper_renditions_for',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Wallpaper the resized renditions were generated for.', max_length=300, verbose_name='wallpaper renditions for'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='word_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Words in the article. Calculated from the blog body on save.', verbose_name='word count'),
+        ),
+        migrations.AddField(
+            model_name='articlecategory',
+            name='article_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of articles in the category.', verbose_name='article count'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='wallpaper',
+            field=models.ImageField(blank=True, help_text='wallpaper for the article. This image and its thumbnail will be used everywhere.', max_length=300, null=True, storage=modules.storage.ContentAddressedStorage(), upload_to=modules.utils.generate_upload_path, verbose_name='wallpaper'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-comment_count', '-id'], name='articles_comment_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-last_commented_on', '-id'], name='articles_last_commented_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'created_on'], name='comment_article_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='articleslugredirect',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slug_redirects', to='Blog.Article'),
+        ),
+        migrations.AddField(
+            model_name='articlesearchtoken',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='Blog.Article'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='articlesearchtoken',
+            unique_together={('term', 'article')},
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
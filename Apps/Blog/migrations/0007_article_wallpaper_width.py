@@ -0,0 +1,25 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+def regenerate_renditions(apps, schema_editor):
+    # renditions made before the width was recorded are named after widths they may not have. Marking them missing
+    # lets `generate_wallpaper_renditions` make them again.
+    apps.get_model('Blog', 'Article').objects.exclude(wallpaper_renditions_for='').update(wallpaper_renditions_for='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Blog', '0006_article_counters_html_and_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='wallpaper_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Width in pixels of the wallpaper the renditions were generated for.', null=True, verbose_name='wallpaper width'),
+        ),
+        migrations.RunPython(regenerate_renditions, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from django.urls.base import reverse
+from django.utils import timezone
 
-from modules.utils import generate_upload_path, create_slug
+from modules.storage import ContentAddressedStorage
+from modules.utils import generate_upload_path, content_stats, html_excerpt, sanitize_html, unique_slug
 
 
 class BaseAppModel(models.Model):
@@ -21,10 +25,28 @@ class BaseAppModel(models.Model):
         return '%s-%s' % (self.id, self.name)
 
 
+class ArticleCategoryManager(models.Manager):
+
+    def add_articles(self, category_ids, count):
+        # `count` is negative when articles leave the categories
+        return self.get_queryset().filter(pk__in=list(category_ids)).update(
+            article_count=Greatest(F('article_count') + count, 0)
+        )
+
+    def unique_slug(self, name, category_id=None):
+        return unique_slug(name, lambda candidates: self.get_queryset().filter(slug__in=candidates)
+                           .exclude(pk=category_id).values_list('slug', flat=True))
+
+
 class ArticleCategory(BaseAppModel):
 
     slug = models.SlugField('slug', max_length=50, blank=True, db_index=True)
 
+    article_count = models.PositiveIntegerField('article count', default=0, editable=False,
+                                                help_text="Number of articles in the category.")
+
+    objects = ArticleCategoryManager()
+
     class Meta:
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
@@ -34,20 +56,94 @@ class ArticleCategory(BaseAppModel):
     def __str__(self):
         return '%s - %s' % (self.id, self.name)
 
-    # @property
-    # def get_absolute_url(self):
-    #     return reverse('category', kwargs={'slug': self.slug})
+    @property
+    def get_absolute_url(self):
+        return reverse('category', kwargs={'category_slug': self.slug})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the slug only changes with the name, see save()
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        self.slug = create_slug(self.name)
+        if not self.slug or self.name != getattr(self, '_loaded_name', None):
+            self.slug = ArticleCategory.objects.unique_slug(self.name, self.pk)
+            self._loaded_name = self.name
+        if self.pk is not None and not self._state.adding:
+            # article_count is only changed by F() updates, a stale value must not be written back
+            update_fields = ['name', 'slug', 'updated_on']
         super().save(force_insert=False, force_update=False, using=None,
-                     update_fields=None)
+                     update_fields=update_fields)
+
+
+class ArticleQuerySet(models.QuerySet):
+
+    # columns rendered by the listing cards. The `blog` body is never loaded on the listing.
+    LISTING_FIELDS = (
+        'id', 'name', 'slug', 'intro_excerpt', 'wallpaper', 'created_on', 'reading_time', 'comment_count',
+        'last_commented_on', 'views_count', 'wallpaper_renditions_for', 'wallpaper_width',
+        'published_by__id', 'published_by__username', 'published_by__first_name', 'published_by__last_name',
+    )
+
+    def for_listing(self):
+        return self.only(*self.LISTING_FIELDS)
+
+    def for_sort(self, sort):
+        # the sorts of ArticleCursorPagination skip articles without a value to sort on
+        if sort == 'discussed':
+            return self.filter(comment_count__gt=0)
+        if sort == 'active':
+            return self.filter(last_commented_on__isnull=False)
+        return self
 
 
 class ArticleManager(models.Manager):
 
     def get_queryset(self):
-        return super().get_queryset().select_related('published_by').prefetch_related('category')
+        return ArticleQuerySet(self.model, using=self._db).select_related('published_by').prefetch_related('category')
+
+    def for_listing(self):
+        return self.get_queryset().for_listing()
+
+    def unique_slug(self, name, article_id=None, reserved=()):
+        """A short free slug for an article named `name`. The candidates are checked against the slugs of the articles
+        and the old slugs still redirecting in one query. The old slugs of `article_id` itself are free for it, the
+        `reserved` ones are not."""
+        def taken(candidates):
+            slugs = self.get_queryset().select_related(None).prefetch_related(None).order_by()
+            redirects = ArticleSlugRedirect.objects.order_by().exclude(article_id=article_id)
+            used = (slugs.filter(slug__in=candidates).values_list('slug', flat=True)
+                    .union(redirects.filter(old_slug__in=candidates).values_list('old_slug', flat=True)))
+            return list(used) + [candidate for candidate in candidates if candidate in reserved]
+        return unique_slug(name, taken)
+
+    def touch(self, article_ids):
+        # marks articles as changed when something they show changes without saving them, e.g. their categories
+        return self.get_queryset().filter(pk__in=list(article_ids)).update(updated_on=timezone.now())
+
+    def record_comment(self, article_id, commented_on, count=1):
+        # single UPDATE, so concurrent comments never lose an increment. Coalesce because GREATEST is NULL on SQLite
+        # when any argument is NULL
+        commented_on = Value(commented_on, output_field=models.DateTimeField())
+        return self.get_queryset().filter(pk=article_id).update(
+            comment_count=F('comment_count') + count,
+            last_commented_on=Greatest(Coalesce('last_commented_on', commented_on), commented_on),
+        )
+
+    def add_views(self, counts):
+        # one UPDATE for a batch of {article id: new views}
+        increments = Case(*[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+                          default=Value(0), output_field=models.PositiveIntegerField())
+        return self.get_queryset().filter(pk__in=list(counts)).update(views_count=F('views_count') + increments)
+
+    def forget_comment(self, article_id):
+        latest_comment = Comment.objects.filter(article_id=OuterRef('pk')).order_by('-created_on').values('created_on')
+        return self.get_queryset().filter(pk=article_id).update(
+            comment_count=Greatest(F('comment_count') - 1, 0),
+            last_commented_on=Subquery(latest_comment[:1]),
+        )
 
 
 class Article(BaseAppModel):
@@ -61,13 +157,44 @@ class Article(BaseAppModel):
     blog = models.TextField(null=True, blank=True)
     intro = models.TextField('intro', max_length=500, help_text='Brief of your article in 50-60 words.')
 
+    blog_html = models.TextField('blog html', blank=True, default='', editable=False,
+                                 help_text="Sanitized blog body. Rendered from the blog on save.")
+    intro_excerpt = models.TextField('intro excerpt', blank=True, default='', editable=False,
+                                     help_text="Sanitized intro cut to 60 words. Rendered from the intro on save.")
+    html_version = models.PositiveSmallIntegerField('html version', default=0, editable=False, db_index=True,
+                                                    help_text="Whitelist version the html fields were rendered "
+                                                              "with.")
+
     wallpaper = models.ImageField('wallpaper', max_length=300, null=True, blank=True, upload_to=generate_upload_path,
+                                  storage=ContentAddressedStorage(),
                                   help_text="wallpaper for the article. This image and its thumbnail "
                                             "will be used everywhere.")
 
     published_by = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="user", db_index=True,
                                      help_text="User who published the article.", on_delete=models.CASCADE)
 
+    word_count = models.PositiveIntegerField('word count', default=0, editable=False, db_index=True,
+                                             help_text="Words in the article. Calculated from the blog body on save.")
+    image_count = models.PositiveSmallIntegerField('image count', default=0, editable=False,
+                                                   help_text="Images in the article. Calculated from the blog body "
+                                                             "on save.")
+    reading_time = models.PositiveSmallIntegerField('reading time', default=1, editable=False, db_index=True,
+                                                    help_text="Minutes needed to read the article. "
+                                                              "Calculated from the blog body on save.")
+
+    comment_count = models.PositiveIntegerField('comment count', default=0, editable=False,
+                                                help_text="Number of comments on the article.")
+    last_commented_on = models.DateTimeField('last commented on', null=True, blank=True, editable=False,
+                                             help_text="When the article was last commented on.")
+    views_count = models.PositiveIntegerField('views count', default=0, editable=False,
+                                              help_text="Number of times the article was viewed.")
+    wallpaper_renditions_for = models.CharField('wallpaper renditions for', max_length=300, blank=True, default='',
+                                                editable=False,
+                                                help_text="Wallpaper the resized renditions were generated for.")
+    wallpaper_width = models.PositiveIntegerField('wallpaper width', null=True, blank=True, editable=False,
+                                                  help_text="Width in pixels of the wallpaper the renditions were "
+                                                            "generated for.")
+
     objects = ArticleManager()
 
     class Meta:
@@ -75,6 +202,10 @@ class Article(BaseAppModel):
         verbose_name = "Blogs"
         db_table = "articles"
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['-comment_count', '-id'], name='articles_comment_count_idx'),
+            models.Index(fields=['-last_commented_on', '-id'], name='articles_last_commented_idx'),
+        ]
 
     def __str__(self):
         return '%s-%s' % (self.id, self.name)
@@ -83,6 +214,66 @@ class Article(BaseAppModel):
     def get_absolute_url(self):
         return reverse('blog_view', kwargs={'blog_slug': self.slug})
 
+    # fields derived from the blog body by `update_content_stats`
+    CONTENT_STATS_FIELDS = ['word_count', 'image_count', 'reading_time']
+
+    def update_content_stats(self):
+        self.word_count, self.image_count, self.reading_time = content_stats(self.blog)
+
+    # fields rendered from the blog body and intro by `render_html`
+    HTML_FIELDS = ['blog_html', 'intro_excerpt', 'html_version']
+
+    def render_html(self):
+        self.blog_html = sanitize_html(self.blog)
+        self.intro_excerpt = html_excerpt(self.intro)
+        self.html_version = settings.BLOG_HTML_VERSION
+
+    # fields only ever changed by queryset updates (counters, background jobs). A plain save of a loaded article must
+    # not write back their stale values.
+    UPDATE_ONLY_FIELDS = ['comment_count', 'last_commented_on', 'views_count', 'wallpaper_renditions_for',
+                          'wallpaper_width']
+
+    def save(self, *args, **kwargs):
+        self.update_content_stats()
+        self.render_html()
+        if self.pk is not None and not self._state.adding and not args and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.UPDATE_ONLY_FIELDS and
+                                       field.attname not in deferred]
+        super().save(*args, **kwargs)
+
+
+class ArticleSlugRedirectManager(models.Manager):
+
+    def current_slug(self, old_slug):
+        """Slug of the article that had `old_slug`, None when no article had it. One lookup on the unique index."""
+        return self.get_queryset().filter(old_slug=old_slug).values_list('article__slug', flat=True).first()
+
+    def record(self, old_slug, article):
+        # an article renamed back to one of its old slugs takes it over again
+        self.get_queryset().filter(old_slug=article.slug).delete()
+        return self.create(old_slug=old_slug, article=article)
+
+
+class ArticleSlugRedirect(models.Model):
+    """Old slug of a renamed article. Links to it are permanently redirected to the current url of the article."""
+
+    old_slug = models.CharField('old slug', max_length=500, unique=True,
+                                help_text="slug the article had before it was renamed.")
+    article = models.ForeignKey(Article, related_name='slug_redirects', on_delete=models.CASCADE)
+    created_on = models.DateTimeField('created on', auto_now_add=True)
+
+    objects = ArticleSlugRedirectManager()
+
+    class Meta:
+        verbose_name = 'Slug redirect'
+        verbose_name_plural = 'Slug redirects'
+        db_table = 'article_slug_redirect'
+
+    def __str__(self):
+        return '%s -> %s' % (self.old_slug, self.article_id)
+
 
 class CommentsManager(models.Manager):
 
@@ -107,6 +298,24 @@ class Comment(BaseAppModel):
         verbose_name = "Comment"
         db_table = "comment"
         ordering = ['-created_on']
+        indexes = [
+            models.Index(fields=['article', 'created_on'], name='comment_article_created_idx'),
+        ]
 
     def __str__(self):
         return '%s' % self.comment[0:30]
+
+
+class ArticleSearchToken(models.Model):
+    """Inverted index of articles used for search on databases without full text search. Every row is a term of an
+    article with its weight in that article."""
+
+    term = models.CharField('term', max_length=64)
+    article = models.ForeignKey(Article, related_name='search_tokens', on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField('weight', default=1)
+
+    class Meta:
+        verbose_name = 'Search token'
+        verbose_name_plural = 'Search tokens'
+        db_table = 'article_search_token'
+        unique_together = ('term', 'article',)
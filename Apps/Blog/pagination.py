@@ -0,0 +1,188 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ArticleCursorPagination(BasePagination):
+    """Keyset pagination of articles over the ordering of their `?sort=`. The cursor holds every ordering column of
+    the first or last article of a page, e.g. `(comment_count, id)`, so the next page is a range scan on the index of
+    that ordering however many articles share a comment count, and page N costs the same as page 1."""
+
+    page_size = 10
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # `?sort=` values and their orderings. Each one is backed by an index on `articles` and ends with the unique `-id`.
+    sort_query_param = 'sort'
+    sort_orderings = OrderedDict([
+        ('latest', ('-id',)),
+        ('discussed', ('-comment_count', '-id')),
+        ('active', ('-last_commented_on', '-id')),
+    ])
+
+    def __init__(self):
+        self.page = []
+        self.has_next = False
+        self.has_previous = False
+        self.ordering = None
+        self.request = None
+
+    def get_sort(self, request):
+        sort = request.query_params.get(self.sort_query_param)
+        return sort if sort in self.sort_orderings else 'latest'
+
+    def get_ordering(self, request, queryset, view):
+        return self.sort_orderings[self.get_sort(request)]
+
+    def encode_cursor(self, article, reverse):
+        # `reverse` cursors point at the first article of a page and go back to the previous one
+        position = [getattr(article, field.lstrip('-')) for field in self.ordering]
+        position = [value.isoformat() if isinstance(value, datetime) else value for value in position]
+        return urlsafe_b64encode(json.dumps([int(reverse)] + position).encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            reverse, *position = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            if len(position) != len(self.ordering) or None in position:
+                raise ValueError
+            return bool(reverse), [model._meta.get_field(field.lstrip('-')).to_python(value)
+                                   for field, value in zip(self.ordering, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def keyset_filter(self, position, reverse):
+        """Articles after `position` in the ordering, or before it when `reverse`. (a, id) < (x, y) is written
+        a <= x AND (a < x OR (a = x AND id < y)), the first condition bounding the scan of the index."""
+        fields = [field.lstrip('-') for field in self.ordering]
+        lookups = ['lt' if field.startswith('-') != reverse else 'gt' for field in self.ordering]
+        after = Q(**{'%s__%s' % (fields[-1], lookups[-1]): position[-1]})
+        for field, lookup, value in reversed(list(zip(fields, lookups, position))[:-1]):
+            after = Q(**{'%s__%s' % (field, lookup): value}) | (Q(**{field: value}) & after)
+        if len(fields) > 1:
+            after &= Q(**{'%s__%se' % (fields[0], lookups[0]): position[0]})
+        return after
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = cursor is not None and cursor[0]
+        ordering = self.ordering
+        if cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(cursor[1], reverse))
+            if reverse:
+                ordering = [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, cursor is not None
+        return self.page
+
+    def get_link(self, article, reverse):
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(article, reverse))
+
+    def get_next_link(self):
+        return self.get_link(self.page[-1], False) if self.has_next and self.page else None
+
+    def get_previous_link(self):
+        return self.get_link(self.page[0], True) if self.has_previous and self.page else None
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class CategoryArticlePagination(ArticleCursorPagination):
+    """Article pages of a category are only listed newest first."""
+
+    sort_orderings = OrderedDict([
+        ('latest', ('-id',)),
+    ])
+
+
+class CommentKeysetPagination(BasePagination):
+    """Keyset pagination over comments of an article, newest first. The cursor is the `(created_on, id)` of the last
+    comment on the page, so every page is a range scan on the `comment(article_id, created_on)` index."""
+
+    cursor_query_param = 'before'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = settings.BLOG_COMMENTS_PAGE_SIZE
+        self.page = []
+        self.has_next = False
+        self.request = None
+
+    @staticmethod
+    def encode_cursor(comment):
+        # `comment` is a Comment or a `.values()` row of one
+        if isinstance(comment, dict):
+            position = '%s|%s' % (comment['created_on'].isoformat(), comment['id'])
+        else:
+            position = '%s|%s' % (comment.created_on.isoformat(), comment.id)
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_on, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            created_on = parse_datetime(created_on)
+            if created_on is None:
+                raise ValueError
+            return created_on, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_on, pk = cursor
+            queryset = queryset.filter(Q(created_on__lt=created_on) | Q(created_on=created_on, id__lt=pk))
+
+        results = list(queryset.order_by('-created_on', '-id')[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('cursor', self.get_next_cursor()),
+            ('results', data),
+        ]))
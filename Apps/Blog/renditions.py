@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+from .models import Article
+
+logger = logging.getLogger(__name__)
+
+# Pillow format names of the rendition file extensions
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def rendition_name(name, width, extension):
+    # MEDIA_ROOT/<wallpaper dir>/renditions/<wallpaper name>-<width>w.<extension>
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, 'renditions', '%s-%sw.%s' % (os.path.splitext(filename)[0], width, extension))
+
+
+def rendition_widths(original_width):
+    # wallpapers are never upscaled: the widths past the original are one rendition at the original width
+    return sorted({min(width, original_width) for width in settings.BLOG_WALLPAPER_RENDITION_WIDTHS})
+
+
+def rendition_names(name, original_width):
+    return [(rendition_name(name, width, extension), width, extension)
+            for extension in settings.BLOG_WALLPAPER_RENDITION_FORMATS
+            for width in rendition_widths(original_width)]
+
+
+def generate_renditions(article_id):
+    """Write every width and format of the article wallpaper next to it and mark the article as having them."""
+    article = Article.objects.select_related(None).prefetch_related(None).only('id', 'wallpaper').get(pk=article_id)
+    name = article.wallpaper.name
+    if not name:
+        return []
+
+    storage = article.wallpaper.storage
+    with storage.open(name) as wallpaper:
+        original = Image.open(wallpaper)
+        original.load()
+
+    written = []
+    for path, width, extension in rendition_names(name, original.width):
+        image = original.copy()
+        image.thumbnail((width, original.height), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA') or (extension == 'jpeg' and image.mode != 'RGB'):
+            image = image.convert('RGB')
+        content = BytesIO()
+        image.save(content, PIL_FORMATS[extension], quality=settings.BLOG_WALLPAPER_RENDITION_QUALITY)
+        if storage.exists(path):
+            storage.delete(path)
+        written.append(storage.save(path, ContentFile(content.getvalue())))
+
+    # the wallpaper may have been replaced while the renditions were made
+    Article.objects.filter(pk=article_id, wallpaper=name).update(wallpaper_renditions_for=name,
+                                                                 wallpaper_width=original.width)
+    return written
+
+
+def run_rendition_job(article_id):
+    try:
+        return generate_renditions(article_id)
+    except Exception:
+        logger.exception('Could not generate wallpaper renditions of article %s', article_id)
+        raise
+    finally:
+        # worker threads get their own database connection
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BLOG_WALLPAPER_RENDITION_WORKERS,
+                                           thread_name_prefix='wallpaper-renditions')
+        return _executor
+
+
+def schedule_renditions(article_id):
+    """Generate the renditions off the request path once the current transaction commits."""
+    if settings.BLOG_WALLPAPER_RENDITIONS_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(run_rendition_job, article_id))
+    else:
+        transaction.on_commit(lambda: generate_renditions(article_id))
+
+
+def wallpaper_srcset(article, extension):
+    if (not article.wallpaper or article.wallpaper_renditions_for != article.wallpaper.name or
+            not article.wallpaper_width):
+        return ''
+    return ', '.join('%s %sw' % (article.wallpaper.storage.url(path), width)
+                     for path, width, rendition_extension in rendition_names(article.wallpaper.name,
+                                                                             article.wallpaper_width)
+                     if rendition_extension == extension)
@@ -0,0 +1,135 @@
+import re
+from collections import Counter
+from html import unescape
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils.html import strip_tags
+
+from .models import Article, ArticleSearchToken
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to was were will with'.split()
+)
+
+# relative weight of a match in each field
+FIELD_WEIGHTS = (('name', 10), ('intro', 5), ('body', 1))
+SEARCH_FIELDS = ('id', 'name', 'intro', 'blog')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1 and token not in STOP_WORDS]
+
+
+def article_document(article):
+    return {
+        'name': article.name or '',
+        'intro': unescape(strip_tags(article.intro or '')),
+        'body': unescape(strip_tags(article.blog or '')),
+    }
+
+
+class InvertedIndexBackend:
+    """Term -> article index kept in the `article_search_token` table. Works on every database."""
+
+    def clear(self):
+        ArticleSearchToken.objects.all().delete()
+
+    def _tokens(self, article):
+        document = article_document(article)
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(document[field]):
+                weights[term[:64]] += weight
+        return [ArticleSearchToken(term=term, article_id=article.id, weight=weight) for term, weight in weights.items()]
+
+    def index(self, articles):
+        articles = list(articles)
+        tokens = [token for article in articles for token in self._tokens(article)]
+        with transaction.atomic():
+            ArticleSearchToken.objects.filter(article_id__in=[article.id for article in articles]).delete()
+            ArticleSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+    def remove(self, article_id):
+        ArticleSearchToken.objects.filter(article_id=article_id).delete()
+
+    def search(self, query, offset, limit):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # articles containing all the terms, ranked by the sum of term weights. Every term is an indexed lookup.
+        rows = (ArticleSearchToken.objects.filter(term__in=terms).values('article')
+                .annotate(matched=Count('term'), score=Sum('weight')).filter(matched=len(terms))
+                .order_by('-score', '-article')[offset:offset + limit])
+        return [row['article'] for row in rows]
+
+
+class SqliteFtsBackend:
+    """SQLite FTS5 virtual table with the article id as rowid, ranked with bm25."""
+
+    table = 'article_search'
+
+    def __init__(self):
+        self._created = False
+
+    def ensure_table(self):
+        if not self._created:
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(name, intro, body, "
+                               "tokenize='porter unicode61')" % self.table)
+            self._created = True
+
+    def clear(self):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+
+    def index(self, articles):
+        self.ensure_table()
+        rows = []
+        for article in articles:
+            document = article_document(article)
+            rows.append((article.id, document['name'], document['intro'], document['body']))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % self.table, [(row[0],) for row in rows])
+            cursor.executemany('INSERT INTO %s (rowid, name, intro, body) VALUES (%%s, %%s, %%s, %%s)' % self.table,
+                               rows)
+
+    def remove(self, article_id):
+        self.ensure_table()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % self.table, [article_id])
+
+    def search(self, query, offset, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        self.ensure_table()
+        # every term is quoted so user input never reaches the FTS query syntax
+        match = ' '.join('"%s"' % term for term in terms)
+        weights = ', '.join(str(weight) for field, weight in FIELD_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid FROM {0} WHERE {0} MATCH %s ORDER BY bm25({0}, {1}) LIMIT %s OFFSET %s'
+                           .format(self.table, weights), [match, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def get_search_backend():
+    name = settings.BLOG_SEARCH_BACKEND
+    if name == 'auto':
+        name = 'fts5' if connection.vendor == 'sqlite' else 'inverted'
+    if name not in _backends:
+        _backends[name] = SqliteFtsBackend() if name == 'fts5' else InvertedIndexBackend()
+    return _backends[name]
+
+
+def search_articles(query, offset=0, limit=10):
+    """Listing articles matching `query`, most relevant first."""
+    ids = get_search_backend().search(query, offset, limit)
+    articles = Article.objects.for_listing().in_bulk(ids)
+    return [articles[pk] for pk in ids if pk in articles]
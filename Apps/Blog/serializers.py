@@ -1,12 +1,14 @@
-from uuid import uuid4
 
 from django.contrib.auth.models import User
 from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from django.utils.timesince import timesince
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import Article, ArticleCategory, Comment
+from .cache import invalidate_articles
+from .models import Article, ArticleCategory, ArticleSlugRedirect, Comment
+from .pagination import CommentKeysetPagination
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -58,7 +60,6 @@ class ArticleReadSerializer(serializers.ModelSerializer):
     created_on = serializers.DateTimeField(format='%d-%b-%Y', required=False)
     categories = serializers.SerializerMethodField()
     published_by = serializers.SerializerMethodField()
-    comments = CommentReadSerializer(source='comment', many=True)
 
     def get_categories(self, obj):
         return [i.name for i in obj.category.all()]
@@ -68,8 +69,63 @@ class ArticleReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Article
-        fields = ['id', 'name', 'slug', 'intro', 'blog', 'wallpaper', 'categories', 'category', 'created_on',
-                  'published_by', 'comments']
+        fields = ['id', 'name', 'slug', 'intro', 'intro_excerpt', 'blog_html', 'wallpaper', 'categories', 'category',
+                  'created_on', 'published_by', 'word_count', 'reading_time']
+
+    def to_representation(self, instance):
+        # only the newest comments are embedded, older ones are loaded from the comment list endpoint using
+        # `comments_cursor`
+        data = super().to_representation(instance)
+        page_size = settings.BLOG_COMMENTS_PAGE_SIZE
+        comments = list(instance.comment.order_by('-created_on', '-id')[:page_size + 1])
+        data['comments'] = CommentReadSerializer(comments[:page_size], many=True).data
+        data['comments_cursor'] = (CommentKeysetPagination.encode_cursor(comments[page_size - 1])
+                                   if len(comments) > page_size else None)
+        return data
+
+
+class SparseFieldsMixin:
+    """Keeps only the fields listed in the `fields` serializer context, which the API views fill from `?fields=`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CommentApiSerializer(serializers.ModelSerializer):
+    comment_by = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'comment', 'comment_by', 'created_on']
+
+    def get_comment_by(self, obj):
+        return {'id': obj.comment_by.id, 'username': obj.comment_by.username,
+                'full_name': obj.comment_by.get_full_name()}
+
+
+class ArticleApiSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    intro = serializers.CharField(source='intro_excerpt', read_only=True)
+    blog = serializers.CharField(source='blog_html', read_only=True)
+    categories = serializers.SerializerMethodField()
+    published_by = serializers.SerializerMethodField()
+
+    # model columns behind the fields that are not always loaded
+    FIELD_COLUMNS = {'intro': 'intro_excerpt', 'blog': 'blog_html'}
+
+    class Meta:
+        model = Article
+        fields = ['id', 'name', 'slug', 'intro', 'blog', 'wallpaper', 'categories', 'published_by', 'word_count',
+                  'reading_time', 'comment_count', 'created_on', 'updated_on', 'last_commented_on']
+
+    def get_categories(self, obj):
+        return [{'name': i.name, 'slug': i.slug} for i in obj.category.all()]
+
+    def get_published_by(self, obj):
+        return {'id': obj.published_by.id, 'full_name': obj.published_by.get_full_name()}
 
 
 class ArticleSerializer(serializers.ModelSerializer):
@@ -83,14 +139,86 @@ class ArticleSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         categories = validated_data.pop('category')
-        slug = "-".join([slugify(validated_data['name']), str(uuid4())])
+        slug = Article.objects.unique_slug(validated_data['name'])
         article = Article.objects.create(slug=slug, **validated_data)
-        for cat in categories:
-            article.category.add(cat)
+        article.category.add(*categories)
         return article
 
     def update(self, instance, validated_data):
-        if validated_data['wallpaper'] is None:
+        if validated_data.get('wallpaper') is None:
             validated_data['wallpaper'] = instance.wallpaper
+        old_slug = instance.slug
+        name = validated_data.get('name', instance.name)
+        if slugify(name) != slugify(instance.name):
+            instance.slug = Article.objects.unique_slug(name, instance.id)
         instance = super().update(instance, validated_data)
+        if instance.slug != old_slug:
+            # links to the old url keep working
+            ArticleSlugRedirect.objects.record(old_slug, instance)
+            invalidate_articles(old_slug)
         return instance
+
+
+# Fast read path: plain dict builders with the same output as CommentReadSerializer and ArticleReadSerializer, without
+# the per field DRF machinery. Comments are built from `.values()` rows. `manage.py benchmark_serializers` compares
+# both paths.
+COMMENT_READ_VALUES = (
+    'id', 'created_on', 'updated_on', 'comment', 'article', 'comment_by', 'comment_by__username',
+    'comment_by__first_name', 'comment_by__last_name',
+)
+
+_iso_datetime = serializers.DateTimeField()
+_article_date = serializers.DateTimeField(format='%d-%b-%Y')
+
+
+def comment_read_data(rows):
+    data = []
+    for row in rows:
+        first_name, last_name = row['comment_by__first_name'], row['comment_by__last_name']
+        username = row['comment_by__username']
+        initials = first_name[0] + last_name[0] if first_name and last_name else username[0:2]
+        data.append({
+            'id': row['id'],
+            'comment_by': {
+                'id': row['comment_by'],
+                'full_name': ('%s %s' % (first_name, last_name)).strip(),
+                'username': username
+            },
+            'initials': initials.upper(),
+            'created_on': timesince(row['created_on']),
+            'updated_on': _iso_datetime.to_representation(row['updated_on']),
+            'comment': row['comment'],
+            'article': row['article'],
+        })
+    return data
+
+
+def article_read_data(article, request=None):
+    page_size = settings.BLOG_COMMENTS_PAGE_SIZE
+    comments = list(article.comment.order_by('-created_on', '-id').values(*COMMENT_READ_VALUES)[:page_size + 1])
+    categories = list(article.category.all())
+
+    wallpaper = None
+    if article.wallpaper:
+        wallpaper = article.wallpaper.url
+        if request is not None:
+            wallpaper = request.build_absolute_uri(wallpaper)
+
+    return {
+        'id': article.id,
+        'name': article.name,
+        'slug': article.slug,
+        'intro': article.intro,
+        'intro_excerpt': article.intro_excerpt,
+        'blog_html': article.blog_html,
+        'wallpaper': wallpaper,
+        'categories': [i.name for i in categories],
+        'category': [i.pk for i in categories],
+        'created_on': _article_date.to_representation(article.created_on),
+        'published_by': {'id': article.published_by.id, 'full_name': article.published_by.get_full_name()},
+        'word_count': article.word_count,
+        'reading_time': article.reading_time,
+        'comments': comment_read_data(comments[:page_size]),
+        'comments_cursor': (CommentKeysetPagination.encode_cursor(comments[page_size - 1])
+                            if len(comments) > page_size else None),
+    }
@@ -0,0 +1,169 @@
+import threading
+
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed, post_migrate
+from django.dispatch import receiver
+
+from .accounts import ensure_email_index
+from .cache import invalidate_articles, invalidate_categories
+from .models import Article, ArticleCategory, Comment
+from .renditions import schedule_renditions
+from .search import get_search_backend
+
+
+@receiver([post_save, post_delete], sender=Article)
+def invalidate_article_cache(sender, instance, **kwargs):
+    invalidate_articles(instance.slug)
+
+
+def changed_articles(articles):
+    # an article shows the names of its categories, so these changes count as changes of the article
+    articles = list(articles.values_list('id', 'slug'))
+    Article.objects.touch([pk for pk, slug in articles])
+    invalidate_articles(*[slug for pk, slug in articles])
+
+
+@receiver([post_save, pre_delete], sender=ArticleCategory)
+def invalidate_category_articles_cache(sender, instance, **kwargs):
+    changed_articles(instance.category.all())
+
+
+@receiver(m2m_changed, sender=Article.category.through)
+def invalidate_article_categories_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        # the article itself, no need to look it up
+        Article.objects.touch([instance.pk])
+        invalidate_articles(instance.slug)
+    elif pk_set:
+        changed_articles(Article.objects.filter(pk__in=pk_set))
+    else:
+        changed_articles(instance.category.all())
+
+
+# ids of the articles being deleted by this thread, whose comments go with them
+_deleting = threading.local()
+
+
+def deleting_articles():
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+@receiver(pre_delete, sender=Article)
+def mark_deleting_article(sender, instance, **kwargs):
+    deleting_articles().add(instance.pk)
+
+
+@receiver(post_delete, sender=Article)
+def unmark_deleting_article(sender, instance, **kwargs):
+    deleting_articles().discard(instance.pk)
+
+
+@receiver(request_finished)
+def forget_deleting_articles(sender, **kwargs):
+    # a delete that failed half way never sent its post_delete
+    deleting_articles().clear()
+
+
+def comment_article_slug(comment):
+    # the article is often loaded already, else only its slug is read
+    if Comment.article.is_cached(comment):
+        return comment.article.slug
+    return Article.objects.filter(pk=comment.article_id).values_list('slug', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_article_cache(sender, instance, **kwargs):
+    # the comments of a deleted article leave with it, its own post_delete drops its cached payload
+    if instance.article_id in deleting_articles():
+        return
+    slug = comment_article_slug(instance)
+    if slug:
+        invalidate_articles(slug)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        Article.objects.record_comment(instance.article_id, instance.created_on)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    if instance.article_id not in deleting_articles():
+        Article.objects.forget_comment(instance.article_id)
+
+
+@receiver(post_save, sender=Article)
+def index_article(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Article)
+def unindex_article(sender, instance, **kwargs):
+    get_search_backend().remove(instance.id)
+
+
+@receiver(post_migrate)
+def create_search_table(sender, **kwargs):
+    # created along with the blog tables rather than on first use, which may be inside a transaction that rolls back
+    backend = get_search_backend()
+    if sender.name == 'Apps.Blog' and hasattr(backend, 'ensure_table'):
+        backend.ensure_table()
+
+
+@receiver(post_migrate)
+def create_email_index(sender, **kwargs):
+    if sender.name == 'Apps.Blog':
+        ensure_email_index()
+
+
+@receiver(m2m_changed, sender=Article.category.through)
+def count_category_articles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    change = -1 if action in ('post_remove', 'pre_clear') else 1
+    if not reverse:
+        category_ids = instance.category.values_list('id', flat=True) if action == 'pre_clear' else pk_set
+        category_ids = list(category_ids)
+        ArticleCategory.objects.add_articles(category_ids, change)
+    else:
+        count = instance.category.count() if action == 'pre_clear' else len(pk_set)
+        category_ids = [instance.id]
+        ArticleCategory.objects.add_articles(category_ids, change * count)
+    invalidate_categories(*category_ids)
+
+
+def article_category_ids(article):
+    # the categories the article was loaded with spare a query, the category form fields are saved after it
+    if 'category' in getattr(article, '_prefetched_objects_cache', {}):
+        return [category.id for category in article.category.all()]
+    return list(article.category.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Article)
+def uncount_category_article(sender, instance, **kwargs):
+    # the through rows of a deleted article go without an m2m_changed signal
+    ids = article_category_ids(instance)
+    ArticleCategory.objects.add_articles(ids, -1)
+    invalidate_categories(*ids)
+
+
+@receiver(post_save, sender=Article)
+def invalidate_article_categories(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_categories(*article_category_ids(instance))
+
+
+@receiver([post_save, post_delete], sender=ArticleCategory)
+def invalidate_category(sender, instance, **kwargs):
+    invalidate_categories(instance.id)
+
+
+@receiver(post_save, sender=Article)
+def render_wallpaper(sender, instance, **kwargs):
+    if instance.wallpaper and instance.wallpaper.name != instance.wallpaper_renditions_for:
+        schedule_renditions(instance.id)
@@ -1,20 +1,28 @@
-import math
-
 from django import template
-from django.template.defaultfilters import stringfilter
+
+from modules.utils import reading_time
+from ..cache import get_category_sidebar
+from ..renditions import wallpaper_srcset
 
 register = template.Library()
 
 
 @register.filter(name='wordscount', is_safe=True)
-@stringfilter
 def words_count(value):
+    # read time of an article, its serialized data or a plain html body. Articles carry the value calculated on save
+    if isinstance(value, dict):
+        return value.get('reading_time') or reading_time(value.get('blog'))
+    if hasattr(value, 'reading_time'):
+        return value.reading_time
+    return reading_time(str(value))
+
+
+@register.filter(name='wallpaper_srcset')
+def wallpaper_srcset_filter(article, extension):
+    # empty until the renditions of the current wallpaper are generated
+    return wallpaper_srcset(article, extension)
+
 
-    words_list = value.split(' ')
-    img_count = value.count('<img')
-    time_taken = (len(words_list) / 250) + (img_count / 10)     # time in minutes
-    count = math.ceil(time_taken)
-    if count > 1:
-        return count
-    else:
-        return 1
+@register.inclusion_tag('blogs/category_sidebar.html')
+def category_sidebar(active=None):
+    return {'categories': get_category_sidebar(), 'active': active}
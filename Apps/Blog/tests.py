@@ -1,3 +1,1380 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Value
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from modules.asgi import ASGIHandler
+from modules.checks import check_production_settings
+from modules.database import database_config
+from modules.metrics import MetricsRegistry, render
+from modules.queries import QueryBudget
+from modules.ratelimit import TokenBucket, parse_rate
+from modules.utils import sanitize_html
+
+from .accounts import EMAIL_INDEX, NormalizedEmail, email_taken
+from .cache import article_cache_key, article_cache_stats, get_category_sidebar, throttle_stats
+from .comments import CommentWriteQueue
+from .counters import ViewCountBuffer, count_article_view, view_counts
+from .renditions import generate_renditions, wallpaper_srcset
+from .search import get_search_backend, search_articles
+from .uploads import INVALID_IMAGE_MESSAGE
+from .serializers import ArticleApiSerializer, ArticleReadSerializer, ArticleSerializer, article_read_data
+from .models import Article, ArticleCategory, ArticleSlugRedirect, Comment
+
+
+@override_settings(BLOG_WALLPAPER_RENDITIONS_ASYNC=False, BLOG_QUERY_HEADERS=True)
+class QueryCeilingTests(TestCase):
+    """Every url of the blog runs a bounded number of queries, whatever the amount of articles, categories, authors
+    and comments. The ceilings are the counts the views run today: raise one only when a view really needs another
+    query, never to let an N+1 through."""
+
+    ARTICLES = 60
+    AUTHORS = 8
+    CATEGORIES = 6
+    COMMENTS = 120
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user('author%d' % i, 'author%d@example.com' % i, 'password',
+                                     first_name='Author', last_name=str(i))
+            for i in range(cls.AUTHORS)
+        ]
+        cls.user = cls.authors[0]
+        categories = [ArticleCategory.objects.create(name='Category %d' % i) for i in range(cls.CATEGORIES)]
+
+        body = '<p>%s</p><img src="https://example.com/a.png">' % ('lorem ipsum ' * 400)
+        for i in range(cls.ARTICLES):
+            article = Article.objects.create(name='Article %d' % i, slug='article-%d' % i, intro='Intro %d' % i,
+                                             blog=body, published_by=cls.authors[i % cls.AUTHORS])
+            article.category.set(categories[i % cls.CATEGORIES:i % cls.CATEGORIES + 3])
+            Comment.objects.bulk_create([
+                Comment(article=article, comment_by=cls.authors[j % cls.AUTHORS], comment='Comment %d' % j)
+                for j in range(i % 4)
+            ])
+        cls.category = categories[0]
+
+        # the newest article carries a long discussion by every author
+        cls.article = Article.objects.get(slug='article-%d' % (cls.ARTICLES - 1))
+        for j in range(cls.COMMENTS):
+            Comment.objects.create(article=cls.article, comment_by=cls.authors[j % cls.AUTHORS],
+                                   comment='Discussion %d' % j)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertQueryCeiling(self, ceiling, method, url, data=None, status=200, **extra):
+        with QueryBudget() as budget:
+            response = getattr(self.client, method)(url, data, **extra)
+        self.assertEqual(response.status_code, status)
+        self.assertLessEqual(budget.count, ceiling, '%s %s ran %d queries' % (method.upper(), url, budget.count))
+        self.assertEqual(budget.duplicates, 0, '%s %s ran a query twice' % (method.upper(), url))
+        return response
+
+    def test_index(self):
+        self.assertQueryCeiling(2, 'get', reverse('index_page'))
+
+    def test_blogs(self):
+        for sort in ('latest', 'discussed', 'active'):
+            with self.subTest(sort=sort):
+                self.assertQueryCeiling(5, 'get', reverse('blogs_page'), {'sort': sort})
+
+    def test_blogs_next_page(self):
+        response = self.client.get(reverse('blogs_page'))
+        self.assertQueryCeiling(5, 'get', response.context['next_url'])
+
+    def test_blog_add(self):
+        self.assertQueryCeiling(4, 'get', reverse('add_blog'))
+
+    def test_blog_search(self):
+        self.assertQueryCeiling(5, 'get', reverse('blog_search'), {'q': 'article lorem'})
+
+    def test_category(self):
+        self.assertQueryCeiling(6, 'get', reverse('category', kwargs={'category_slug': self.category.slug}))
+
+    def test_blog_view(self):
+        url = reverse('blog_view', kwargs={'blog_slug': self.article.slug})
+        response = self.assertQueryCeiling(6, 'get', url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.assertQueryCeiling(3, 'get', url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_blog_update(self):
+        self.client.force_login(self.article.published_by)
+        self.assertQueryCeiling(6, 'get', reverse('blog_update', kwargs={'blog_slug': self.article.slug}))
+
+    def test_blog_create(self):
+        self.assertQueryCeiling(14, 'post', reverse('blogs_page'), {
+            'name': 'A new article', 'intro': 'Intro', 'blog': '<p>Body</p>',
+            'category': [self.category.id, self.category.id + 1],
+        }, status=302)
+
+    def test_blog_edit(self):
+        self.client.force_login(self.article.published_by)
+        self.assertQueryCeiling(24, 'post', reverse('blog_update', kwargs={'blog_slug': self.article.slug}), {
+            'name': 'A renamed article', 'intro': 'Intro', 'blog': '<p>Body</p>',
+            'category': [self.category.id, self.category.id + 1],
+        }, status=302)
+
+    def test_comment_add(self):
+        self.assertQueryCeiling(8, 'post', reverse('comment_add', kwargs={'blog_slug': self.article.slug}),
+                                {'comment': 'Another comment'}, status=302)
+
+    def test_comment_add_ajax(self):
+        self.assertQueryCeiling(8, 'post', reverse('comment_add', kwargs={'blog_slug': self.article.slug}),
+                                {'comment': 'Another comment'}, status=201, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_comment_list(self):
+        url = reverse('comment_list', kwargs={'blog_slug': self.article.slug})
+        response = self.assertQueryCeiling(4, 'get', url)
+        self.assertQueryCeiling(4, 'get', url, {'before': response.data['cursor']})
+
+    def test_api_blogs(self):
+        self.assertQueryCeiling(4, 'get', reverse('api_blogs'))
+
+    def test_api_blog(self):
+        self.assertQueryCeiling(5, 'get', reverse('api_blog', kwargs={'blog_slug': self.article.slug}))
+
+    def test_api_comments(self):
+        self.assertQueryCeiling(5, 'get', reverse('api_comments', kwargs={'blog_slug': self.article.slug}))
+
+    def test_feeds(self):
+        for feed in ('rss', 'atom'):
+            with self.subTest(feed=feed):
+                url = reverse('article_feed', kwargs={'feed': feed})
+                self.assertQueryCeiling(3, 'get', url)
+                # every item comes from the fragment cache now
+                self.assertQueryCeiling(1, 'get', url)
+
+    def test_sitemaps(self):
+        self.assertQueryCeiling(1, 'get', reverse('sitemap_index'))
+        self.assertQueryCeiling(2, 'get', reverse('sitemap_page', kwargs={'page': 0}))
+
+    def test_login(self):
+        self.client.logout()
+        self.assertQueryCeiling(0, 'get', reverse('login'))
+
+    def test_signup(self):
+        self.client.logout()
+        self.assertQueryCeiling(0, 'get', reverse('signup'))
+        # the user is inserted in a savepoint, a lost race for the username or email is reported by the form
+        self.assertQueryCeiling(14, 'post', reverse('signup'), {
+            'username': 'reader', 'email': 'reader@example.com',
+            'password1': 'a long pass phrase', 'password2': 'a long pass phrase',
+        }, status=302)
+
+    def test_logout(self):
+        self.assertQueryCeiling(4, 'get', reverse('logout'), status=302)
+
+    def test_headers(self):
+        response = self.client.get(reverse('blogs_page'))
+        self.assertIn('X-Query-Count', response)
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+
+
+class QueryBudgetTests(TestCase):
+    def test_counts_duplicates_and_similar_queries(self):
+        with QueryBudget() as budget:
+            list(User.objects.filter(pk=1))
+            list(User.objects.filter(pk=1))
+            list(User.objects.filter(pk=2))
+        self.assertEqual((budget.count, budget.duplicates, budget.similar), (3, 1, 2))
+
+
+class MigrationTests(TransactionTestCase):
+    BASELINE = [('Blog', '0001_squashed_0005_remove_comment_name')]
+
+    def test_models_match_the_migrations(self):
+        call_command('makemigrations', 'Blog', check=True, dry_run=True, stdout=io.StringIO())
+
+    def test_upgrade_counts_existing_rows(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.BASELINE)
+        executor.loader.build_graph()
+        old_apps = executor.loader.project_state(self.BASELINE).apps
+        user = old_apps.get_model('auth', 'User').objects.create(username='grace')
+        category = old_apps.get_model('Blog', 'ArticleCategory').objects.create(name='Old', slug='old')
+        article = old_apps.get_model('Blog', 'Article').objects.create(name='Old', slug='old', intro='intro',
+                                                                       published_by=user)
+        article.category.add(category)
+        comments = old_apps.get_model('Blog', 'Comment').objects
+        comments.create(article=article, comment_by=user, comment='first')
+        latest = comments.create(article=article, comment_by=user, comment='second')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('Blog'))
+        article = Article.objects.get(pk=article.pk)
+        self.assertEqual((article.comment_count, article.last_commented_on), (2, latest.created_on))
+        self.assertEqual(ArticleCategory.objects.get(pk=category.pk).article_count, 1)
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_url(self):
+        self.assertEqual(database_config('sqlite:///db.sqlite3', '/srv/blog', conn_max_age=60), {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': '/srv/blog/db.sqlite3', 'CONN_MAX_AGE': 60,
+        })
+        self.assertEqual(database_config('sqlite:////var/lib/blog.db', '/srv/blog')['NAME'], '/var/lib/blog.db')
+
+    def test_postgres_url(self):
+        config = database_config('postgres://blog:s%40cret@db:6432/blog?sslmode=require&pgbouncer=1', '/srv/blog',
+                                 conn_max_age=300)
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql', 'NAME': 'blog', 'USER': 'blog', 'PASSWORD': 's@cret',
+            'HOST': 'db', 'PORT': '6432', 'CONN_MAX_AGE': 300, 'DISABLE_SERVER_SIDE_CURSORS': True,
+            'OPTIONS': {'sslmode': 'require'},
+        })
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            database_config('mysql://localhost/blog', '/srv/blog')
+
+
+class SqlitePragmaTests(TestCase):
+    def test_new_connections_are_tuned(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            # 1 is NORMAL
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class ProductionSettingsCheckTests(SimpleTestCase):
+    def test_development_profile_is_not_checked(self):
+        self.assertEqual(check_production_settings(None), [])
+
+    @override_settings(BLOG_PRODUCTION=True, DEBUG=False,
+                       STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_dev_pieces_in_production(self):
+        # the test settings are the development profile: debug toolbar, debug context processor, plain static files,
+        # locmem cache
+        ids = {error.id for error in check_production_settings(None)}
+        self.assertEqual(ids, {'blog.E002', 'blog.E003', 'blog.E004', 'blog.E005', 'blog.E007'})
+
+    @override_settings(BLOG_PRODUCTION=True, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_sessions_in_process_memory(self):
+        self.assertIn('blog.E006', {error.id for error in check_production_settings(None)})
+
+    @override_settings(BLOG_PRODUCTION=True, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': '127.0.0.1:11211'}})
+    def test_shared_cache(self):
+        self.assertNotIn('blog.E007', {error.id for error in check_production_settings(None)})
+
+
+class CommentSubmitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'password', first_name='Ada',
+                                            last_name='Lovelace')
+        cls.article = Article.objects.create(name='Article', slug='article', intro='Intro', blog='<p>Body</p>',
+                                             published_by=cls.user)
+        cls.url = reverse('comment_add', kwargs={'blog_slug': 'article'})
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_form_post_redirects(self):
+        response = self.client.post(self.url, {'comment': 'Hello'})
+        self.assertRedirects(response, reverse('blog_view', kwargs={'blog_slug': 'article'}),
+                             fetch_redirect_response=False)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).comment_count, 1)
+
+    def test_ajax_post_returns_the_comment_fragment(self):
+        response = self.client.post(self.url, {'comment': 'Hello <b>there</b>'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['initials'], 'AL')
+        self.assertIn('Ada Lovelace', response.data['html'])
+        self.assertIn('Hello &lt;b&gt;there&lt;/b&gt;', response.data['html'])
+        self.assertEqual(Comment.objects.filter(article=self.article).count(), 1)
+
+    def test_invalid_comment(self):
+        response = self.client.post(self.url, {'comment': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(BLOG_COMMENTS_WRITE_BEHIND=True)
+    def test_write_behind(self):
+        queue = CommentWriteQueue(batch_size=10, interval=60, background=False)
+        with mock.patch('Apps.Blog.views.comment_queue', queue):
+            for i in range(3):
+                response = self.client.post(self.url, {'comment': 'Queued %d' % i},
+                                            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                self.assertEqual(response.status_code, 202)
+        self.assertIn('Queued 2', response.data['html'])
+        self.assertEqual(queue.pending(), 3)
+        self.assertFalse(Comment.objects.exists())
+
+        # the articles still there, then one INSERT and one counter UPDATE per article, in a savepoint
+        with QueryBudget() as budget:
+            self.assertEqual(queue.flush(), 3)
+        self.assertEqual(budget.count, 5)
+        article = Article.objects.get(pk=self.article.pk)
+        self.assertEqual(article.comment_count, 3)
+        self.assertEqual(article.last_commented_on, Comment.objects.latest('created_on').created_on)
+        self.assertEqual(queue.pending(), 0)
+
+    def queued(self, text, article=None):
+        return Comment(comment_by=self.user, article=article or self.article, comment=text, created_on=timezone.now())
+
+    def test_write_behind_skips_deleted_articles(self):
+        queue = CommentWriteQueue(batch_size=10, interval=60, background=False)
+        gone = Article.objects.create(name='Gone', slug='gone', intro='Intro', blog='<p>Body</p>',
+                                      published_by=self.user)
+        queue.add(self.queued('Orphan', gone), gone.slug)
+        gone.delete()
+        queue.add(self.queued('Kept'), self.article.slug)
+
+        self.assertEqual(queue.flush(), 1)
+        self.assertEqual(queue.pending(), 0)
+        self.assertEqual(list(Comment.objects.values_list('comment', flat=True)), ['Kept'])
+        self.assertEqual(Article.objects.get(pk=self.article.pk).comment_count, 1)
+
+    def test_write_behind_drops_refused_comments(self):
+        queue = CommentWriteQueue(batch_size=10, interval=60, background=False)
+        bulk_create = Comment.objects.bulk_create
+
+        def refuse_bad(comments, **kwargs):
+            if any(comment.comment == 'Bad' for comment in comments):
+                raise IntegrityError('refused')
+            return bulk_create(comments, **kwargs)
+
+        for text in ('First', 'Bad', 'Last'):
+            queue.add(self.queued(text), self.article.slug)
+        with mock.patch.object(Comment.objects, 'bulk_create', side_effect=refuse_bad):
+            self.assertEqual(queue.flush(), 2)
+        self.assertEqual(queue.pending(), 0)
+        self.assertEqual(set(Comment.objects.values_list('comment', flat=True)), {'First', 'Last'})
+        self.assertEqual(Article.objects.get(pk=self.article.pk).comment_count, 2)
+
+    def test_write_behind_retries_are_capped(self):
+        queue = CommentWriteQueue(batch_size=10, interval=60, background=False, retries=1)
+        queue.add(self.queued('Stuck'), self.article.slug)
+        with mock.patch.object(Comment.objects, 'bulk_create', side_effect=OperationalError('database is locked')), \
+                mock.patch('Apps.Blog.comments.connection.close'):
+            self.assertEqual(queue.flush(), 0)
+            self.assertEqual(queue.pending(), 1)
+            self.assertEqual(queue.flush(), 0)
+        self.assertEqual(queue.pending(), 0)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(BLOG_COMMENTS_WRITE_BEHIND=True)
+    def test_full_queue_writes_at_once(self):
+        queue = CommentWriteQueue(batch_size=10, interval=60, background=False, max_pending=1)
+        with mock.patch('Apps.Blog.views.comment_queue', queue):
+            statuses = [self.client.post(self.url, {'comment': 'Comment %d' % i},
+                                         HTTP_X_REQUESTED_WITH='XMLHttpRequest').status_code for i in range(2)]
+        self.assertEqual(statuses, [202, 201])
+        self.assertEqual(queue.pending(), 1)
+        self.assertEqual(list(Comment.objects.values_list('comment', flat=True)), ['Comment 1'])
+
+
+@override_settings(BLOG_FEED_SIZE=3, BLOG_SITEMAP_PAGE_SIZE=2)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', first_name='Grace', last_name='Hopper')
+        cls.category = ArticleCategory.objects.create(name='Tips & Tricks')
+        cls.articles = []
+        for i in range(5):
+            article = Article.objects.create(name='Article <%d>' % i, slug='article-%d' % i, intro='Intro %d' % i,
+                                             blog='<p>Body</p>', published_by=cls.user)
+            article.category.add(cls.category)
+            cls.articles.append(article)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_xml(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, ElementTree.fromstring(b''.join(response.streaming_content))
+
+    def test_rss(self):
+        response, rss = self.get_xml(reverse('article_feed', kwargs={'feed': 'rss'}))
+        self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
+        self.assertEqual([item.findtext('title') for item in rss.iter('item')],
+                         ['Article <4>', 'Article <3>', 'Article <2>'])
+        self.assertEqual(rss.find('channel/item/category').text, 'Tips & Tricks')
+
+    def test_atom(self):
+        response, atom = self.get_xml(reverse('article_feed', kwargs={'feed': 'atom'}))
+        entries = atom.findall('{http://www.w3.org/2005/Atom}entry')
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0].findtext('{http://www.w3.org/2005/Atom}author/{http://www.w3.org/2005/Atom}name'),
+                         'Grace Hopper')
+
+    def test_conditional_get(self):
+        url = reverse('article_feed', kwargs={'feed': 'rss'})
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.articles[4].name = 'Renamed'
+        self.articles[4].save()
+        response, rss = self.get_xml(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(rss.find('channel/item').findtext('title'), 'Renamed')
+
+    def test_unknown_feed(self):
+        self.assertEqual(self.client.get(reverse('article_feed', kwargs={'feed': 'json'})).status_code, 404)
+
+    def test_sitemap(self):
+        response, index = self.get_xml(reverse('sitemap_index'))
+        namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+        pages = [location.text for location in index.iter(namespace + 'loc')]
+        self.assertEqual(len(pages), len({article.id // 2 for article in self.articles}))
+
+        slugs = []
+        for page in pages:
+            response, urlset = self.get_xml(page)
+            slugs += [location.text.rstrip('/').rsplit('/', 1)[1] for location in urlset.iter(namespace + 'loc')]
+        self.assertEqual(slugs, ['article-%d' % i for i in range(5)])
+        self.assertEqual(self.client.get(reverse('sitemap_page', kwargs={'page': 1000})).status_code, 404)
+
+
+class ArticleTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', email='writer@example.com')
+        reader = User.objects.create_user('reader')
+        cls.category = ArticleCategory.objects.create(name='Python')
+        article = Article.objects.create(name='Exported', slug='exported', intro='Intro', blog='<p>Body</p>',
+                                         published_by=cls.user)
+        article.category.add(cls.category)
+        for i in range(3):
+            Comment.objects.create(article=article, comment_by=reader, comment='Comment %d' % i)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'articles.ndjson.gz')
+
+    def export(self):
+        call_command('export_articles', self.path, stderr=io.StringIO())
+
+    def import_(self):
+        call_command('import_articles', self.path, '--batch-size=2', stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_round_trip(self):
+        self.export()
+        Article.objects.all().delete()
+        User.objects.filter(username='reader').delete()
+        self.import_()
+
+        article = Article.objects.get(slug='exported')
+        self.assertEqual(list(article.category.all()), [self.category])
+        self.assertEqual(article.comment_count, 3)
+        self.assertEqual(sorted(article.comment.values_list('comment', flat=True)),
+                         ['Comment 0', 'Comment 1', 'Comment 2'])
+        self.assertFalse(User.objects.get(username='reader').has_usable_password())
+
+    def test_import_twice_updates(self):
+        self.export()
+        Article.objects.filter(slug='exported').update(name='Changed')
+        self.import_()
+        self.import_()
+        self.assertEqual(Article.objects.get(slug='exported').name, 'Exported')
+        self.assertEqual(Comment.objects.count(), 3)
+
+
+class BackfillArticleStatsTests(TestCase):
+    def test_fills_emptied_columns(self):
+        user = User.objects.create_user('writer')
+        body = '<p>%s</p><img src="/a.png"><p><img src="/b.png"></p>' % ' '.join(['word'] * 600)
+        articles = [Article.objects.create(name='Long %d' % i, slug='long-%d' % i, intro='<p>Intro <b>%d</b></p>' % i,
+                                           blog=body, published_by=user) for i in range(3)]
+        fields = ['word_count', 'image_count', 'reading_time', 'intro_excerpt']
+        expected = [[getattr(article, field) for field in fields] for article in articles]
+        self.assertEqual(expected[0][:3], [600, 2, 3])
+        Article.objects.update(word_count=0, image_count=0, reading_time=1, intro_excerpt='')
+        cache.set(article_cache_key('long-0'), {'version': None, 'data': {}})
+
+        out = io.StringIO()
+        call_command('backfill_article_stats', batch_size=2, stdout=out)
+        self.assertIn('Done. 3 articles updated.', out.getvalue())
+        self.assertEqual([list(values) for values in Article.objects.order_by('id').values_list(*fields)], expected)
+        self.assertIsNone(cache.get(article_cache_key('long-0')))
+
+
+class ViewCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('reader')
+        cls.first, cls.second, cls.third = [
+            Article.objects.create(name='Viewed %d' % i, slug='viewed-%d' % i, intro='Intro', published_by=user)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def views(self):
+        return dict(Article.objects.order_by('id').values_list('slug', 'views_count'))
+
+    def test_flush_at_threshold(self):
+        buffer = ViewCountBuffer(threshold=3, interval=60, background=False)
+        buffer.add(self.first.id)
+        buffer.add(self.second.id)
+        self.assertEqual((buffer.pending(), self.views()['viewed-0']), (2, 0))
+        buffer.add(self.first.id)
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(self.views(), {'viewed-0': 2, 'viewed-1': 1, 'viewed-2': 0})
+
+    def test_one_update_per_batch(self):
+        with self.assertNumQueries(1):
+            Article.objects.add_views({self.first.id: 5, self.third.id: 1})
+        self.assertEqual(self.views(), {'viewed-0': 5, 'viewed-1': 0, 'viewed-2': 1})
+
+    def test_views_of_another_database_are_dropped(self):
+        buffer = ViewCountBuffer(threshold=10, interval=60, background=False)
+        buffer.add(self.first.id)
+        with mock.patch.dict(connection.settings_dict, NAME='another.sqlite3'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual((buffer.pending(), self.views()['viewed-0']), (0, 0))
+
+    def test_viewers_are_counted_once(self):
+        request = RequestFactory().get('/', HTTP_USER_AGENT='Mozilla/5.0')
+        request.session, request.user = SessionStore(), AnonymousUser()
+        self.assertTrue(count_article_view(request, self.first.id))
+        self.assertFalse(count_article_view(request, self.first.id))
+        self.assertTrue(count_article_view(request, self.second.id))
+        bot = RequestFactory().get('/', HTTP_USER_AGENT='Googlebot/2.1', REMOTE_ADDR='192.0.2.9')
+        bot.session, bot.user = SessionStore(), AnonymousUser()
+        self.assertFalse(count_article_view(bot, self.third.id))
+        # the test transaction never commits, so nothing reached the buffer of the process
+        self.assertEqual(view_counts.pending(), 0)
+
+
+def image_file(name, width, height, format='PNG', noise=False):
+    content = io.BytesIO()
+    if noise:
+        image = Image.frombytes('RGB', (width, height), os.urandom(width * height * 3))
+    else:
+        image = Image.new('RGB', (width, height), (200, 80, 40))
+    image.save(content, format)
+    return SimpleUploadedFile(name, content.getvalue(), content_type='image/%s' % format.lower())
+
+
+def png_header(width, height):
+    """The signature and header chunks of a PNG of any size, without its pixels."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', b''))
+
+
+def use_temporary_media(test_case):
+    media = tempfile.TemporaryDirectory()
+    test_case.addCleanup(media.cleanup)
+    media_root = override_settings(MEDIA_ROOT=media.name)
+    media_root.enable()
+    test_case.addCleanup(media_root.disable)
+    return media.name
+
+
+class WallpaperUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('painter')
+        cls.category = ArticleCategory.objects.create(name='Paintings')
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = use_temporary_media(self)
+        self.client.force_login(self.user)
+
+    def upload(self, wallpaper, name='Wallpaper'):
+        return self.client.post(reverse('blogs_page'), {
+            'name': name, 'intro': 'Intro', 'blog': '<p>Body</p>', 'category': [self.category.id],
+            'wallpaper': wallpaper,
+        })
+
+    def assertRejected(self, wallpaper, message):
+        response = self.upload(wallpaper)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(message, response.data['errors']['wallpaper'][0])
+        self.assertFalse(Article.objects.exists())
+
+    @override_settings(BLOG_WALLPAPER_MAX_UPLOAD_SIZE=4096)
+    def test_oversize_file(self):
+        self.assertRejected(image_file('noise.png', 100, 100, noise=True), 'Image is larger than 4.0\xa0KB.')
+
+    def test_pixel_limit(self):
+        self.assertRejected(SimpleUploadedFile('large.png', png_header(9000, 9000)),
+                            'Image is 9000x9000 pixels, over the limit of 40.0 megapixels.')
+
+    def test_decompression_bomb(self):
+        # so large that Pillow refuses to open it at all
+        self.assertRejected(SimpleUploadedFile('bomb.png', png_header(20000, 20000)),
+                            'Image is over the limit of 40.0 megapixels.')
+
+    def test_not_an_image(self):
+        self.assertRejected(SimpleUploadedFile('notes.png', b'not an image ' * 100), INVALID_IMAGE_MESSAGE)
+
+    def test_identical_uploads_share_a_file(self):
+        wallpaper = image_file('wallpaper.png', 40, 20)
+        content = wallpaper.read()
+        digest = hashlib.sha256(content).hexdigest()
+        for name in ('First', 'Second'):
+            wallpaper.seek(0)
+            self.assertEqual(self.upload(wallpaper, name).status_code, 302)
+
+        names = set(Article.objects.values_list('wallpaper', flat=True))
+        self.assertEqual(names, {'articles/%s/%s/%s.png' % (digest[:2], digest[2:4], digest)})
+        stored = [os.path.join(root, file) for root, dirs, files in os.walk(self.media_root) for file in files]
+        self.assertEqual(len(stored), 1)
+        with open(stored[0], 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+
+@override_settings(BLOG_WALLPAPER_RENDITION_WIDTHS=(320, 640, 1280), BLOG_WALLPAPER_RENDITION_FORMATS=('webp',))
+class RenditionTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def test_widths_past_the_original_are_not_advertised(self):
+        article = Article.objects.create(name='Small wallpaper', slug='small-wallpaper', intro='Intro',
+                                         published_by=User.objects.create_user('painter'),
+                                         wallpaper=image_file('small.png', 800, 400))
+        self.assertEqual(wallpaper_srcset(article, 'webp'), '')
+        written = generate_renditions(article.id)
+
+        article.refresh_from_db()
+        self.assertEqual(article.wallpaper_width, 800)
+        srcset = wallpaper_srcset(article, 'webp')
+        self.assertEqual([candidate.split()[1] for candidate in srcset.split(', ')], ['320w', '640w', '800w'])
+        for path, width in zip(written, (320, 640, 800)):
+            with article.wallpaper.storage.open(path) as rendition:
+                self.assertEqual(Image.open(rendition).size, (width, width // 2))
+
+
+class HtmlSanitizerTests(TestCase):
+    def test_scripts_and_handlers_are_stripped(self):
+        self.assertEqual(sanitize_html('<p onclick="steal()">Hi<script>steal()</script></p>'), '<p>Histeal()</p>')
+        self.assertEqual(sanitize_html('<a href="javascript:steal()">link</a>'), '<a>link</a>')
+        self.assertEqual(sanitize_html('<a href="https://example.com" title="Example">link</a>'),
+                         '<a href="https://example.com" title="Example">link</a>')
+
+    def test_data_uris_only_as_images(self):
+        for link in ('data:text/html;base64,PHNjcmlwdD5zdGVhbCgpPC9zY3JpcHQ+', ' DATA:text/html,<b>',
+                     'd&#97;ta:text/html,page'):
+            with self.subTest(link=link):
+                self.assertEqual(sanitize_html('<a href="%s">link</a>' % link), '<a>link</a>')
+        self.assertEqual(sanitize_html('<img src="data:image/png;base64,iVBORw0KGgo=" alt="Dot">'),
+                         '<img alt="Dot" src="data:image/png;base64,iVBORw0KGgo=">')
+        # svg images can carry scripts
+        self.assertEqual(sanitize_html('<img src="data:image/svg+xml;base64,PHN2Zz4=">'), '<img>')
+
+    def test_stored_body_is_sanitized(self):
+        article = Article.objects.create(
+            name='Unsafe', slug='unsafe', intro='<b onmouseover="steal()">Intro</b>',
+            published_by=User.objects.create_user('mallory'),
+            blog='<p>Body<script>steal()</script><a href="data:text/html;base64,PHNjcmlwdD4=">more</a></p>')
+        self.assertEqual(article.blog_html, '<p>Bodysteal()<a>more</a></p>')
+        self.assertEqual(article.intro_excerpt, '<b>Intro</b>')
+
+
+class ArticlePaginationTests(TestCase):
+    """Most articles share their comment count, the sorted listings must still page through each of them once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.articles = [Article.objects.create(name='Tied %d' % i, slug='tied-%d' % i, intro='Intro',
+                                               blog='<p>Body</p>', published_by=cls.user) for i in range(25)]
+        for i, article in enumerate(cls.articles):
+            for j in range(2 if i % 8 == 0 else 1):
+                Comment.objects.create(article=article, comment_by=cls.user, comment='Comment %d' % j)
+        # everyone last commented at the same moment
+        Article.objects.update(last_commented_on=timezone.now())
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def walk(self, url, key):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([article['slug'] for article in response.data['results']])
+            url = response.data[key]
+        return pages
+
+    def test_sorts_page_through_ties(self):
+        expected = {
+            'discussed': [a.slug for a in sorted(self.articles, key=lambda a: (a.comment.count(), a.id), reverse=True)],
+            'active': [a.slug for a in sorted(self.articles, key=lambda a: a.id, reverse=True)],
+        }
+        for sort, slugs in expected.items():
+            with self.subTest(sort=sort):
+                pages = self.walk('%s?sort=%s' % (reverse('api_blogs'), sort), 'next')
+                self.assertEqual([len(page) for page in pages], [10, 10, 5])
+                self.assertEqual(sum(pages, []), slugs)
+
+                # and back from the last page
+                last = self.client.get('%s?sort=%s' % (reverse('api_blogs'), sort))
+                last = self.client.get(self.client.get(last.data['next']).data['next'])
+                self.assertEqual(self.walk(last.data['previous'], 'previous'), pages[1::-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('api_blogs'), {'sort': 'discussed', 'cursor': 'bm90IGpzb24='})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BLOG_COMMENTS_PAGE_SIZE=3)
+class CommentPaginationTests(TestCase):
+    """Comments written in the same instant must still be listed once each, newest and then highest id first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.article = Article.objects.create(name='Article', slug='article', intro='Intro', blog='<p>Body</p>',
+                                             published_by=cls.user)
+        comments = [Comment.objects.create(article=cls.article, comment_by=cls.user, comment='Comment %d' % i)
+                    for i in range(8)]
+        # three instants, the second one shared by five comments across a page boundary
+        now = timezone.now()
+        instants = [now] * 2 + [now - timezone.timedelta(minutes=1)] * 5 + [now - timezone.timedelta(minutes=2)]
+        for comment, instant in zip(comments, instants):
+            Comment.objects.filter(pk=comment.pk).update(created_on=instant)
+        cls.expected = [pk for instant, pk in sorted(zip(instants, [c.id for c in comments]), reverse=True)]
+        cls.url = reverse('comment_list', kwargs={'blog_slug': 'article'})
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages(self):
+        pages, params = [], {}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([comment['id'] for comment in response.data['results']])
+            if response.data['cursor'] is None:
+                self.assertIsNone(response.data['next'])
+                break
+            params = {'before': response.data['cursor']}
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_last_page_is_full(self):
+        Comment.objects.filter(pk__in=self.expected[-2:]).delete()
+        first = self.client.get(self.url)
+        last = self.client.get(self.url, {'before': first.data['cursor']})
+        self.assertEqual(len(last.data['results']), 3)
+        self.assertIsNone(last.data['cursor'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', 'bm90IGEgY3Vyc29y', 'MjAyMC0wMS0wMXw=', 'bm90IGEgZGF0ZXwx'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'before': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class CategoryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        cls.python, cls.django = [ArticleCategory.objects.create(name=name) for name in ('Python', 'Django')]
+        cls.articles = [Article.objects.create(name='Article %d' % i, slug='article-%d' % i, intro='Intro',
+                                               blog='<p>Body</p>', published_by=cls.user) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        return dict(ArticleCategory.objects.values_list('name', 'article_count'))
+
+    def test_counts_follow_the_articles(self):
+        first, second, third = self.articles
+        first.category.add(self.python, self.django)
+        second.category.add(self.python)
+        self.assertEqual(self.counts(), {'Python': 2, 'Django': 1})
+        first.category.remove(self.django)
+        self.assertEqual(self.counts(), {'Python': 2, 'Django': 0})
+
+        # from the category side
+        self.django.category.add(second, third)
+        self.assertEqual(self.counts(), {'Python': 2, 'Django': 2})
+        self.django.category.remove(third)
+        self.assertEqual(self.counts(), {'Python': 2, 'Django': 1})
+        self.python.category.clear()
+        self.assertEqual(self.counts(), {'Python': 0, 'Django': 1})
+
+        second.category.add(self.python)
+        second.category.clear()
+        self.assertEqual(self.counts(), {'Python': 0, 'Django': 0})
+
+        third.category.add(self.python, self.django)
+        third.delete()
+        self.assertEqual(self.counts(), {'Python': 0, 'Django': 0})
+
+    def test_sidebar(self):
+        self.articles[0].category.add(self.python)
+        self.assertEqual(get_category_sidebar(), [{'name': 'Python', 'slug': 'python', 'article_count': 1}])
+        with self.assertNumQueries(0):
+            get_category_sidebar()
+
+        self.articles[1].category.add(self.django)
+        self.assertEqual([category['name'] for category in get_category_sidebar()], ['Django', 'Python'])
+        ArticleCategory.objects.get(pk=self.django.pk).save()
+        with self.assertNumQueries(1):
+            get_category_sidebar()
+        self.articles[0].delete()
+        self.assertEqual([category['name'] for category in get_category_sidebar()], ['Django'])
+
+    def test_reconcile(self):
+        self.articles[0].category.add(self.python)
+        self.assertEqual(len(get_category_sidebar()), 1)
+        ArticleCategory.objects.update(article_count=5)
+        stdout = io.StringIO()
+        call_command('reconcile_category_counts', stdout=stdout)
+        self.assertIn('2 categories fixed', stdout.getvalue())
+        self.assertEqual(self.counts(), {'Python': 1, 'Django': 0})
+        self.assertEqual(get_category_sidebar(), [{'name': 'Python', 'slug': 'python', 'article_count': 1}])
+
+
+class CommentCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+
+    def article_with_comments(self, slug, count):
+        article = Article.objects.create(name=slug, slug=slug, intro='Intro', blog='<p>Body</p>',
+                                         published_by=self.user)
+        for i in range(count):
+            Comment.objects.create(article=article, comment_by=self.user, comment='Comment %d' % i)
+        return article
+
+    def test_article_delete_costs_the_same_with_more_comments(self):
+        budgets = []
+        for slug, count in (('few', 2), ('many', 10)):
+            article = self.article_with_comments(slug, count)
+            with QueryBudget() as budget:
+                Article.objects.get(pk=article.pk).delete()
+            budgets.append(budget.count)
+        self.assertEqual(budgets[0], budgets[1])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_comment_delete(self):
+        article = self.article_with_comments('article', 2)
+        first, last = Comment.objects.order_by('created_on')
+        last.delete()
+        article.refresh_from_db()
+        self.assertEqual((article.comment_count, article.last_commented_on), (1, first.created_on))
+        first.delete()
+        article.refresh_from_db()
+        self.assertEqual((article.comment_count, article.last_commented_on), (0, None))
+
+    def test_reconcile(self):
+        article = self.article_with_comments('article', 3)
+        untouched = self.article_with_comments('untouched', 1)
+        Article.objects.filter(pk=article.pk).update(comment_count=7, last_commented_on=None)
+        out = io.StringIO()
+        call_command('reconcile_comment_counts', batch_size=1, stdout=out)
+        self.assertIn('2 articles checked, 1 fixed', out.getvalue())
+        article.refresh_from_db()
+        latest = Comment.objects.filter(article=article).latest('created_on')
+        self.assertEqual((article.comment_count, article.last_commented_on), (3, latest.created_on))
+        self.assertEqual(Article.objects.get(pk=untouched.pk).comment_count, 1)
+
+
+class ArticleCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.article = Article.objects.create(name='Cached', slug='cached', intro='Intro', blog='<p>Body</p>',
+                                             published_by=cls.user)
+        cls.url = reverse('blog_view', kwargs={'blog_slug': 'cached'})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def x_cache(self):
+        return self.client.get(self.url)['X-Cache']
+
+    def test_comment_written_elsewhere(self):
+        self.assertEqual([self.x_cache(), self.x_cache()], ['MISS', 'HIT'])
+        # another process wrote the comment, nothing dropped the entry of this one
+        comment = Comment.objects.bulk_create([Comment(article=self.article, comment_by=self.user, comment='Late',
+                                                       created_on=timezone.now())])[0]
+        Article.objects.record_comment(self.article.id, comment.created_on)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([c['comment'] for c in response.data['blog']['comments']], ['Late'])
+
+    def test_writes_drop_the_entry(self):
+        category = ArticleCategory.objects.create(name='Python')
+        comment = Comment.objects.create(article=self.article, comment_by=self.user, comment='First')
+        writes = {
+            'article saved': lambda: Article.objects.get(pk=self.article.pk).save(),
+            'category added': lambda: self.article.category.add(category),
+            'category renamed': lambda: ArticleCategory.objects.get(pk=category.pk).save(),
+            'category removed': lambda: self.article.category.remove(category),
+            'comment added': lambda: Comment.objects.create(article=self.article, comment_by=self.user,
+                                                            comment='Second'),
+            'comment saved': lambda: Comment.objects.get(pk=comment.pk).save(),
+            'comment deleted': lambda: Comment.objects.get(pk=comment.pk).delete(),
+        }
+        for write, run in writes.items():
+            with self.subTest(write=write):
+                self.x_cache()
+                self.assertIsNotNone(cache.get(article_cache_key('cached')))
+                run()
+                self.assertIsNone(cache.get(article_cache_key('cached')))
+                self.assertEqual(self.x_cache(), 'MISS')
+
+    def test_stats(self):
+        self.assertEqual(article_cache_stats(), {'hits': 0, 'misses': 0, 'hit_ratio': 0.0})
+        for _ in range(4):
+            self.x_cache()
+        self.assertEqual(article_cache_stats(), {'hits': 3, 'misses': 1, 'hit_ratio': 0.75})
+
+
+@override_settings(BLOG_COMMENTS_PAGE_SIZE=2)
+class ArticleReadDataTests(TestCase):
+    """article_read_data replaced ArticleReadSerializer on the article page, its output must stay the same."""
+
+    def setUp(self):
+        use_temporary_media(self)
+        author = User.objects.create_user('writer', first_name='Ada', last_name='Lovelace')
+        reader = User.objects.create_user('reader')
+        self.article = Article.objects.create(name='Parity', slug='parity', intro='<p>Intro</p>',
+                                              blog='<p>Body <b>text</b></p>', published_by=author,
+                                              wallpaper=image_file('wallpaper.png', 64, 32))
+        self.article.category.add(ArticleCategory.objects.create(name='Python'),
+                                  ArticleCategory.objects.create(name='Django'))
+        for i, user in enumerate((author, reader, author)):
+            Comment.objects.create(article=self.article, comment_by=user, comment='Comment %d' % i)
+
+    def test_same_as_the_serializer(self):
+        request = RequestFactory().get(reverse('blog_view', kwargs={'blog_slug': 'parity'}))
+        article = Article.objects.get(pk=self.article.pk)
+        expected = ArticleReadSerializer(article, context={'request': request}).data
+        data = article_read_data(article, request)
+        self.assertIsNotNone(data['wallpaper'])
+        self.assertEqual(len(data['comments']), 2)
+        self.assertIsNotNone(data['comments_cursor'])
+        # the JSON, so the order of the keys is compared too
+        self.assertEqual(json.dumps(data), json.dumps(expected))
+
+
+class ArticleApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.article = Article.objects.create(name='Hello', slug='hello', intro='Intro', blog='<p>Body</p>',
+                                             published_by=cls.user)
+        Comment.objects.create(article=cls.article, comment_by=cls.user, comment='First')
+        cls.urls = [
+            reverse('api_blogs'),
+            reverse('api_blog', kwargs={'blog_slug': cls.article.slug}),
+            reverse('api_comments', kwargs={'blog_slug': cls.article.slug}),
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_login_required(self):
+        self.client.logout()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['ETag'])
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+        # a new comment changes every representation of the article
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Comment.objects.create(article=self.article, comment_by=self.user, comment='Second')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sparse_fields(self):
+        url = reverse('api_blog', kwargs={'blog_slug': self.article.slug})
+        response = self.client.get(url, {'fields': 'name,slug,unknown'})
+        self.assertEqual(response.json(), {'name': 'Hello', 'slug': 'hello'})
+        self.assertNotEqual(response['ETag'], self.client.get(url)['ETag'])
+        self.assertEqual(self.client.get(url, {'fields': 'unknown'}).json().keys(),
+                         set(ArticleApiSerializer.Meta.fields))
+
+        results = self.client.get(reverse('api_blogs'), {'fields': 'slug'}).json()['results']
+        self.assertEqual(results, [{'slug': 'hello'}])
+        self.assertNotIn('blog', self.client.get(reverse('api_blogs')).json()['results'][0])
+
+
+class ArticleSlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        cls.category = ArticleCategory.objects.create(name='Python')
+
+    def create(self, name):
+        serializer = ArticleSerializer(data={'name': name, 'intro': 'Intro', 'blog': '<p>Body</p>',
+                                             'category': [self.category.id]})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(published_by=self.user)
+
+    def rename(self, article, name):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('blog_update', kwargs={'blog_slug': article.slug}), {
+            'name': name, 'intro': 'Intro', 'blog': '<p>Body</p>', 'category': [self.category.id],
+        })
+        article.refresh_from_db()
+        self.assertRedirects(response, reverse('blog_view', kwargs={'blog_slug': article.slug}),
+                             fetch_redirect_response=False)
+        return article
+
+    def test_short_unique_slugs(self):
+        first, second = self.create('Hello world'), self.create('Hello world')
+        self.assertEqual(first.slug, 'hello-world')
+        self.assertRegex(second.slug, r'^hello-world-[a-z0-9]{6}$')
+        self.assertLessEqual(len(self.create('Very long title ' * 10).slug), 50)
+        with self.assertNumQueries(1):
+            Article.objects.unique_slug('Hello world')
+
+    def test_rename_redirects(self):
+        article = self.rename(self.create('Hello world'), 'Goodbye world')
+        self.assertEqual(article.slug, 'goodbye-world')
+
+        response = self.client.get(reverse('blog_view', kwargs={'blog_slug': 'hello-world'}))
+        self.assertRedirects(response, reverse('blog_view', kwargs={'blog_slug': 'goodbye-world'}), status_code=301)
+        response = self.client.get(reverse('api_blog', kwargs={'blog_slug': 'hello-world'}), {'fields': 'name'})
+        self.assertRedirects(response, reverse('api_blog', kwargs={'blog_slug': 'goodbye-world'}) + '?fields=name',
+                             status_code=301, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('blog_view', kwargs={'blog_slug': 'unknown'})).status_code, 404)
+
+        # the old slug stays taken by its redirect, until the article gets it back
+        self.assertNotEqual(self.create('Hello world').slug, 'hello-world')
+        self.assertEqual(self.rename(article, 'Hello world').slug, 'hello-world')
+        self.assertEqual(ArticleSlugRedirect.objects.current_slug('goodbye-world'), 'hello-world')
+        self.assertIsNone(ArticleSlugRedirect.objects.current_slug('hello-world'))
+
+    def test_category_slug(self):
+        other = ArticleCategory.objects.create(name='python!')
+        self.assertRegex(other.slug, r'^python-[a-z0-9]{6}$')
+        slug = other.slug
+        other = ArticleCategory.objects.get(pk=other.pk)
+        other.save()
+        self.assertEqual(other.slug, slug)
+
+
+@override_settings(BLOG_SEARCH_BACKEND='fts5')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        for slug, name, intro, blog in (
+                ('in-body', 'Notes', 'Intro', '<p>Python and <b>Django</b></p>'),
+                ('in-name', 'Python notes', 'Intro', '<p>Body</p>'),
+                ('in-intro', 'Notes', 'All about Python', '<p>Body</p>'),
+                ('unrelated', 'Notes', 'Intro', '<p>Rust</p>')):
+            Article.objects.create(name=name, slug=slug, intro=intro, blog=blog, published_by=cls.user)
+
+    def search(self, query):
+        return [article.slug for article in search_articles(query)]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('python'), ['in-name', 'in-intro', 'in-body'])
+        self.assertEqual(self.search('django python'), ['in-body'])
+        self.assertEqual(self.search('the'), [])
+
+    def test_index_follows_writes(self):
+        article = Article.objects.get(slug='unrelated')
+        article.blog = '<p>Haskell</p>'
+        article.save()
+        self.assertEqual(self.search('haskell'), ['unrelated'])
+        self.assertEqual(self.search('rust'), [])
+        article.delete()
+        self.assertEqual(self.search('haskell'), [])
+
+    def test_rebuild(self):
+        get_search_backend().clear()
+        self.assertEqual(self.search('python'), [])
+        out = io.StringIO()
+        call_command('rebuild_search_index', chunk_size=3, stdout=out)
+        self.assertIn('Done. 4 articles indexed.', out.getvalue())
+        self.assertEqual(self.search('python'), ['in-name', 'in-intro', 'in-body'])
+
+
+@override_settings(BLOG_SEARCH_BACKEND='inverted')
+class InvertedIndexSearchTests(SearchTests):
+    pass
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.handler = ASGIHandler(max_workers=2)
+        self.addCleanup(self.handler.executor.shutdown)
+
+    def request(self, path, messages, method='GET', headers=()):
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'next=/', 'http_version': '1.1',
+                 'headers': [(b'host', b'testserver')] + list(headers), 'server': ('testserver', 80),
+                 'client': ('127.0.0.1', 5000)}
+        messages, sent = list(messages), []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.handler(scope, receive, send))
+        return sent
+
+    def test_get(self):
+        start, body = self.request(reverse('login'), [{'type': 'http.request'}])
+        self.assertEqual(start['status'], 200)
+        headers = dict(start['headers'])
+        self.assertEqual(headers[b'content-type'], b'text/html; charset=utf-8')
+        self.assertTrue(headers[b'set-cookie'].startswith(b'csrftoken='))
+        self.assertIn(b'csrfmiddlewaretoken', body['body'])
+
+    def test_client_gone(self):
+        self.assertEqual(self.request(reverse('login'), [{'type': 'http.disconnect'}]), [])
+
+    def stream(self, chunks):
+        """A get_response answering with the streaming `chunks`, recording the thread reading each and closing it."""
+        threads = []
+
+        def content():
+            for chunk in chunks:
+                threads.append(('read', threading.get_ident()))
+                yield chunk
+
+        def get_response(scope, body):
+            response = StreamingHttpResponse(content())
+            close = response.close
+            response.close = lambda: (threads.append(('close', threading.get_ident())), close())
+            return 200, [], response
+
+        return mock.patch.object(self.handler, 'get_response', get_response), threads
+
+    def test_streaming_stays_on_one_thread(self):
+        chunks = [b'chunk %d ' % i for i in range(50)]
+        get_response, threads = self.stream(chunks)
+        with get_response:
+            start, *body = self.request('/feed/rss/', [{'type': 'http.request'}])
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(b''.join(message['body'] for message in body), b''.join(chunks))
+        self.assertFalse(body[-1].get('more_body', False))
+        self.assertEqual(threads[-1][0], 'close')
+        self.assertEqual(len({thread for action, thread in threads}), 1)
+
+    def test_streaming_closed_when_sending_fails(self):
+        get_response, threads = self.stream(b'chunk %d ' % i for i in range(1000))
+        scope = {'type': 'http', 'method': 'GET', 'path': '/feed/rss/', 'headers': []}
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                raise OSError('client gone')
+
+        with get_response, self.assertRaises(OSError):
+            asyncio.run(self.handler(scope, receive, send))
+        self.assertEqual(threads[-1][0], 'close')
+        self.assertEqual(len({thread for action, thread in threads}), 1)
+        # the thread stopped reading soon after
+        self.assertLess(len(threads), 100)
+
+    def test_environ(self):
+        body = io.BytesIO(b'a=1&b=2')
+        environ = self.handler.get_environ({
+            'type': 'http', 'method': 'POST', 'path': '/blogs/caf\u00e9/', 'query_string': b'x=1',
+            'headers': [(b'content-type', b'application/x-www-form-urlencoded'), (b'content-length', b'7'),
+                        (b'accept', b'text/html'), (b'accept', b'*/*')],
+        }, body)
+        self.assertEqual(environ['PATH_INFO'], '/blogs/caf\u00e9/'.encode('utf-8').decode('latin1'))
+        self.assertEqual(environ['QUERY_STRING'], 'x=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'application/x-www-form-urlencoded')
+        self.assertEqual(environ['CONTENT_LENGTH'], '7')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
+        self.assertIs(environ['wsgi.input'], body)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), (10, 60))
+        self.assertEqual(parse_rate('5/hour'), (5, 3600))
+
+    def test_take(self):
+        bucket = TokenBucket(3, 60)
+        self.assertEqual([bucket.take('bucket', now=1000) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.take('bucket', now=1000), 20)
+        # refused requests take no token, one is back after 20 seconds
+        self.assertAlmostEqual(bucket.take('bucket', now=1010), 10)
+        self.assertEqual(bucket.take('bucket', now=1020), 0)
+        self.assertTrue(bucket.take('bucket', now=1020))
+
+    def test_refund(self):
+        bucket = TokenBucket(2, 60)
+        self.assertEqual([bucket.take('bucket', now=1000) for _ in range(2)], [0, 0])
+        bucket.refund('bucket')
+        self.assertEqual(bucket.take('bucket', now=1000), 0)
+        self.assertTrue(bucket.take('bucket', now=1000))
+        # nothing to give back to an expired bucket
+        bucket.refund('expired')
+        self.assertIsNone(cache.get('expired'))
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(2, 60)
+        bucket.take('bucket', now=1000)
+        # idle for longer than a full refill, the bucket holds 2 tokens, not more
+        self.assertEqual([bucket.take('bucket', now=1050) for _ in range(2)], [0, 0])
+        self.assertTrue(bucket.take('bucket', now=1050))
+
+
+@override_settings(BLOG_THROTTLE_RATES={'comment': {'user': '2/m', 'ip': '3/m'}, 'signup': {'ip': '1/h'}})
+class ThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user('reader%d' % i) for i in range(2)]
+        cls.article = Article.objects.create(name='Throttled', slug='throttled', intro='Intro', blog='<p>Body</p>',
+                                             published_by=cls.users[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, user, **extra):
+        self.client.force_login(user)
+        return self.client.post(reverse('comment_add', kwargs={'blog_slug': self.article.slug}), {'comment': 'Spam'},
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest', **extra)
+
+    def test_comment_per_user_and_address(self):
+        self.assertEqual([self.comment(self.users[0]).status_code for _ in range(3)], [201, 201, 429])
+        # another user from the same address has one request left of the address bucket
+        self.assertEqual([self.comment(self.users[1]).status_code for _ in range(2)], [201, 429])
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(throttle_stats(['comment', 'signup']), {'comment': 2, 'signup': 0})
+
+        # the address refused that request, so the user bucket got its token back
+        other_address = [self.comment(self.users[1], REMOTE_ADDR='10.0.0.2').status_code for _ in range(2)]
+        self.assertEqual(other_address, [201, 429])
+
+    def test_signup(self):
+        data = {'username': 'newcomer', 'email': 'newcomer@example.com',
+                'password1': 'a long pass phrase', 'password2': 'a long pass phrase'}
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 302)
+        self.client.logout()
+        response = self.client.post(reverse('signup'), dict(data, username='another', email='another@example.com'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(reverse('signup')).status_code, 200)
+
+
+class UniqueEmailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('grace', 'Grace@Example.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_email_taken(self):
+        self.assertTrue(email_taken('grace@example.com'))
+        self.assertFalse(email_taken('ada@example.com'))
+        with connection.cursor() as cursor:
+            query, params = (User.objects.annotate(normalized_email=NormalizedEmail('email'))
+                             .filter(normalized_email=NormalizedEmail(Value('a@b.c'))).query.sql_with_params())
+            cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+            self.assertIn(EMAIL_INDEX, str(cursor.fetchall()))
+
+    def test_unique_index(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('impostor', 'GRACE@example.com')
+        # users without an email don't collide
+        User.objects.create_user('nobody')
+        User.objects.create_user('nobody-else')
+
+    def test_signup(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'ada', 'email': 'grace@EXAMPLE.com',
+            'password1': 'a long pass phrase', 'password2': 'a long pass phrase',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(username='ada').exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_endpoint(self):
+        self.client.get(reverse('signup'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE blog_http_request_duration_seconds histogram', text)
+        self.assertIn('blog_http_request_duration_seconds_bucket{method="GET",view="signup",le="+Inf"}', text)
+        self.assertIn('blog_http_response_size_bytes_count{view="signup"}', text)
+        self.assertIn('blog_db_queries_per_request_count{view="signup"}', text)
+        self.assertIn('blog_template_render_duration_seconds_count{template="registration/login.html"}', text)
+
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    @override_settings(BLOG_METRICS_TOKEN='s3cret')
+    def test_token(self):
+        url = reverse('metrics')
+        # the proxy's address is not enough any more
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registry = MetricsRegistry(directory)
+            registry.inc('blog_cache_requests_total', 3, cache='article', result='hit')
+            registry.observe('blog_http_request_duration_seconds', 0.02, view='index_page', method='GET')
+            # the snapshot another worker wrote
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump({
+                    'counters': [['blog_cache_requests_total', [['cache', 'article'], ['result', 'miss']], 1]],
+                    'histograms': [['blog_http_request_duration_seconds', [['method', 'GET'], ['view', 'index_page']],
+                                    [0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1], 12.0]],
+                }, file)
+            text = render(registry.collect())
+
+        self.assertIn('blog_http_request_duration_seconds_bucket{method="GET",view="index_page",le="0.01"} 0', text)
+        self.assertIn('blog_http_request_duration_seconds_bucket{method="GET",view="index_page",le="0.025"} 2', text)
+        self.assertIn('blog_http_request_duration_seconds_bucket{method="GET",view="index_page",le="10.0"} 2', text)
+        self.assertIn('blog_http_request_duration_seconds_bucket{method="GET",view="index_page",le="+Inf"} 3', text)
+        self.assertIn('blog_http_request_duration_seconds_count{method="GET",view="index_page"} 3', text)
+        self.assertIn('blog_cache_hit_ratio{cache="article"} 0.75', text)
@@ -0,0 +1,78 @@
+import math
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from modules.ratelimit import TokenBucket, parse_rate
+
+from .cache import count_throttled
+
+BUCKET_PREFIX = 'blog:bucket'
+
+
+def take_tokens(request, scope):
+    """Take a token from every bucket BLOG_THROTTLE_RATES configures for `scope`: the one of the user, when they are
+    logged in, and the one of the client address. Returns 0 when the request may go on, else the seconds to wait."""
+    user = getattr(request, 'user', None)
+    idents = {
+        'user': user.pk if user is not None and user.is_authenticated else None,
+        # the address as DRF sees it, behind NUM_PROXIES proxies X-Forwarded-For
+        'ip': BaseThrottle().get_ident(request),
+    }
+    taken = []
+    for kind, rate in settings.BLOG_THROTTLE_RATES.get(scope, {}).items():
+        if idents[kind] is None:
+            continue
+        bucket, key = TokenBucket(*parse_rate(rate)), '%s:%s:%s:%s' % (BUCKET_PREFIX, scope, kind, idents[kind])
+        wait = bucket.take(key)
+        if wait:
+            # a refused request costs no token, not even from the buckets that had one
+            for bucket, key in taken:
+                bucket.refund(key)
+            count_throttled(scope)
+            return wait
+        taken.append((bucket, key))
+    return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttles the unsafe methods of a view with the token buckets of `scope`."""
+
+    scope = None
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        self.wait_seconds = take_tokens(request, self.scope)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class CommentThrottle(TokenBucketThrottle):
+    scope = 'comment'
+
+
+class ArticleThrottle(TokenBucketThrottle):
+    scope = 'article'
+
+
+def throttle(scope):
+    """TokenBucketThrottle for plain Django views: refused requests get 429 Too Many Requests."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                wait = take_tokens(request, scope)
+                if wait:
+                    response = HttpResponse('Too many requests, try again in %d seconds.' % math.ceil(wait),
+                                            content_type='text/plain', status=429)
+                    response['Retry-After'] = math.ceil(wait)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapped_view
+    return decorator
@@ -0,0 +1,101 @@
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+# Pillow formats accepted for wallpapers and the extension stored for them
+IMAGE_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+INVALID_IMAGE_MESSAGE = 'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+
+
+class WallpaperUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploaded images to a temporary file in chunks. Files are rejected as soon as they grow over
+    BLOG_WALLPAPER_MAX_UPLOAD_SIZE, or once their header shows they are not an image or decode to more than
+    BLOG_WALLPAPER_MAX_PIXELS, so a decompression bomb is never decoded. Accepted files are renamed to the sha256 of
+    their content, which `generate_upload_path` turns into a content addressed path.
+
+    Rejections are collected in `request.upload_errors` as {field name: message}."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.BLOG_WALLPAPER_MAX_UPLOAD_SIZE
+        self.max_pixels = settings.BLOG_WALLPAPER_MAX_PIXELS
+        self.header_size = settings.BLOG_WALLPAPER_HEADER_SIZE
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.header = b''
+        self.image_format = None
+        self.received = 0
+
+    def reject(self, message):
+        self.file.close()
+        if self.request is not None:
+            self.request.upload_errors[self.field_name] = message
+
+    def header_error(self, complete=False):
+        # Pillow only parses the header on open, pixel data is never decoded here
+        try:
+            image = Image.open(BytesIO(self.header))
+        except Image.DecompressionBombError:
+            # refused by Pillow itself, over twice Image.MAX_IMAGE_PIXELS
+            return 'Image is over the limit of %s megapixels.' % round(self.max_pixels / 1000000, 1)
+        except Exception:
+            if complete or len(self.header) >= self.header_size:
+                return INVALID_IMAGE_MESSAGE
+            return None
+        if image.format not in IMAGE_EXTENSIONS:
+            return '%s images are not supported.' % image.format
+        width, height = image.size
+        if width * height > self.max_pixels:
+            return 'Image is %sx%s pixels, over the limit of %s megapixels.' % (
+                width, height, round(self.max_pixels / 1000000, 1))
+        self.image_format = image.format
+        return None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            message = 'Image is larger than %s.' % filesizeformat(self.max_size)
+            self.reject(message)
+            raise SkipFile(message)
+
+        if self.image_format is None:
+            self.header += raw_data[:self.header_size - len(self.header)]
+            error = self.header_error()
+            if error:
+                self.reject(error)
+                raise SkipFile(error)
+
+        self.sha256.update(raw_data)
+        super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.image_format is None:
+            error = self.header_error(complete=True)
+            if error:
+                # SkipFile is only handled while chunks are received, returning nothing drops the file here
+                self.reject(error)
+                return None
+        upload = super().file_complete(file_size)
+        upload.name = '%s.%s' % (self.sha256.hexdigest(), IMAGE_EXTENSIONS[self.image_format])
+        return upload
+
+
+class WallpaperUploadMixin:
+    """Installs `WallpaperUploadHandler` on DRF views before the request body is parsed."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [WallpaperUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_upload_errors(self, request):
+        # the errors are collected while the body is parsed
+        request.data
+        return {field: [message] for field, message in getattr(request, 'upload_errors', {}).items()}
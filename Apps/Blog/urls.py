@@ -2,15 +2,19 @@ from django.contrib.auth.decorators import login_required
 from django.urls.conf import path
 from django.contrib.auth.views import LogoutView
 
+from .feeds import article_feed, sitemap_index, sitemap_page
 from .views import (
-    index, blog_add, BlogApiView, BlogGetView, BlogUpdateView, submit_comment,
-    CustomLoginView, registration_view, LoginView
+    index, blog_add, blog_search, BlogApiView, BlogGetView, BlogUpdateView, CategoryView, CommentListView,
+    submit_comment, CustomLoginView, registration_view, LoginView, ArticleListApiView, ArticleDetailApiView,
+    CommentListApiView
 )
 
 urlpatterns = [
     path('', index, name='index_page'),
     path('blogs/', BlogApiView.as_view(), name='blogs_page'),
     path('blogs/add/', blog_add, name='add_blog'),
+    path('blogs/search/', blog_search, name='blog_search'),
+    path('categories/<slug:category_slug>/', CategoryView.as_view(), name='category'),
     # path('blogs/upload/', login_required(blog_upload_image), name='upload_blog_image'),
 
     # dynamic url should be at last
@@ -18,6 +22,17 @@ urlpatterns = [
     path('blogs/<slug:blog_slug>/edit', BlogUpdateView.as_view(), name='blog_update'),
     path('blogs/<slug:blog_slug>/comment/', login_required(submit_comment),
          name='comment_add'),
+    path('blogs/<slug:blog_slug>/comments/', CommentListView.as_view(), name='comment_list'),
+
+    # JSON API urls
+    path('api/blogs/', ArticleListApiView.as_view(), name='api_blogs'),
+    path('api/blogs/<slug:blog_slug>/', ArticleDetailApiView.as_view(), name='api_blog'),
+    path('api/blogs/<slug:blog_slug>/comments/', CommentListApiView.as_view(), name='api_comments'),
+
+    # Feeds and sitemaps
+    path('feeds/<str:feed>/', article_feed, name='article_feed'),
+    path('sitemap.xml', sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:page>.xml', sitemap_page, name='sitemap_page'),
 
     # Auth urls
     path('accounts/login/', CustomLoginView.as_view(template_name='registration/login.html'), name='login'),
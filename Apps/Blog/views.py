@@ -1,28 +1,49 @@
 import json
 
 from PIL import Image
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LoginView
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls.base import reverse
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
-from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
 from rest_framework.response import Response
 from rest_framework import generics
 
-from .models import Article
+from modules.http import conditional_response, make_etag
+from modules.metrics import metrics
+
+from .cache import category_page_cache_key, get_article_payload
+from .comments import comment_queue
+from .counters import count_article_view
+from .models import Article, ArticleCategory, ArticleSlugRedirect, Comment
 from .forms import UserCreationForm
-from .serializers import ArticleSerializer, ArticleReadSerializer, CommentWriteSerializer
+from .search import search_articles
+from .serializers import (
+    ArticleApiSerializer, ArticleSerializer, ArticleReadSerializer, CommentApiSerializer, CommentReadSerializer,
+    CommentWriteSerializer, COMMENT_READ_VALUES, article_read_data, comment_read_data
+)
+from .uploads import WallpaperUploadMixin
+from .pagination import ArticleCursorPagination, CategoryArticlePagination, CommentKeysetPagination
 from .permissions import IsOwner
+from .throttling import ArticleThrottle, CommentThrottle, throttle
 
 
 @require_http_methods(['GET', 'POST'])
+@throttle('signup')
 def registration_view(request):
     if request.user.is_authenticated:
         return redirect(reverse('index_page'))
@@ -32,15 +53,21 @@ def registration_view(request):
 
     form = UserCreationForm(request.POST)
     if form.is_valid():
-        form.save()
-        user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password1'])
-        login(request, user)
-        return redirect(reverse('index_page'))
-    else:
-        return render(request, 'registration/login.html', {
-            'form': form,
-            'errors': [v for k, v in form.errors.items()]
-        })
+        try:
+            with transaction.atomic():
+                form.save()
+        except IntegrityError:
+            # the username or email was taken since the form was validated, validating again reports which one
+            form = UserCreationForm(request.POST)
+            form.is_valid()
+        else:
+            user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password1'])
+            login(request, user)
+            return redirect(reverse('index_page'))
+    return render(request, 'registration/login.html', {
+        'form': form,
+        'errors': [v for k, v in form.errors.items()]
+    })
 
 
 class CustomLoginView(LoginView):
@@ -73,28 +100,37 @@ def blog_add(request):
         template_name='blogs/add_blog.html')
 
 
-class BlogApiView(generics.ListCreateAPIView):
+class BlogApiView(WallpaperUploadMixin, generics.ListCreateAPIView):
     serializer_class = ArticleSerializer
     authentication_classes = [SessionAuthentication, BasicAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ArticleThrottle]
     renderer_classes = [TemplateHTMLRenderer]
     template_name = 'blogs/blogs.html'
+    pagination_class = ArticleCursorPagination
 
     def get_queryset(self):
-        return Article.objects.all()
+        return Article.objects.for_listing().for_sort(self.paginator.get_sort(self.request))
 
     def get(self, request, *args, **kwargs):
-        blogs = Article.objects.all()
-        return Response({'blogs': blogs, 'form_url': reverse('blogs_page')})
+        blogs = self.paginate_queryset(self.get_queryset())
+        return Response({
+            'blogs': blogs,
+            'sort': self.paginator.get_sort(request),
+            'next_url': self.paginator.get_next_link(),
+            'previous_url': self.paginator.get_previous_link(),
+            'form_url': reverse('blogs_page')
+        })
 
     def create(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid():
+        upload_errors = self.get_upload_errors(request)
+        if serializer.is_valid() and not upload_errors:
             instance = serializer.save(published_by=self.request.user)
             return redirect(reverse('blog_view', kwargs={'blog_slug': instance.slug}))
         return Response({
             'serializer': serializer,
-            'errors': serializer.errors,
+            'errors': dict(serializer.errors, **upload_errors),
             'data': json.dumps(serializer.data),
             'source': 'Add',
             'form_url': reverse('blogs_page')
@@ -104,6 +140,62 @@ class BlogApiView(generics.ListCreateAPIView):
         serializer.save(published_by=self.request.user)
 
 
+class CategoryView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [TemplateHTMLRenderer]
+    template_name = 'blogs/category.html'
+    pagination_class = CategoryArticlePagination
+
+    def get_queryset(self):
+        return Article.objects.for_listing().filter(category=self.category)
+
+    def get(self, request, *args, **kwargs):
+        self.category = get_object_or_404(ArticleCategory, slug=self.kwargs['category_slug'])
+        # a page holds the listing articles themselves, so a cached page costs no article query
+        key = category_page_cache_key(self.category.id, request.query_params.get('cursor'))
+        page = cache.get(key)
+        metrics.inc('blog_cache_requests_total', cache='category_page', result='miss' if page is None else 'hit')
+        if page is None:
+            page = {
+                'blogs': self.paginate_queryset(self.get_queryset()),
+                'next_url': self.paginator.get_next_link(),
+                'previous_url': self.paginator.get_previous_link(),
+            }
+            cache.set(key, page, settings.BLOG_CATEGORY_CACHE_TIMEOUT)
+        return Response(dict(page, category=self.category))
+
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated,))
+@renderer_classes((TemplateHTMLRenderer,))
+def blog_search(request):
+    query = request.query_params.get('q', '').strip()
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    page_size = settings.BLOG_SEARCH_PAGE_SIZE
+    # one extra result tells whether there is a next page
+    blogs = search_articles(query, (page - 1) * page_size, page_size + 1) if query else []
+    return Response({
+        'blogs': blogs[:page_size],
+        'query': query,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if len(blogs) > page_size else None,
+    }, template_name='blogs/search.html')
+
+
+def redirect_renamed_article(request, url_name, slug):
+    """Permanent redirect to the current url of the article that had `slug` before it was renamed."""
+    current_slug = ArticleSlugRedirect.objects.current_slug(slug)
+    if current_slug is None:
+        raise Http404
+    url = reverse(url_name, kwargs={'blog_slug': current_slug})
+    if request.META.get('QUERY_STRING'):
+        url += '?' + request.META['QUERY_STRING']
+    return redirect(url, permanent=True)
+
+
 class BlogGetView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     renderer_classes = [TemplateHTMLRenderer]
@@ -112,19 +204,28 @@ class BlogGetView(generics.RetrieveAPIView):
     lookup_url_kwarg = 'blog_slug'
 
     def get_object(self):
-        return get_object_or_404(Article, slug=self.kwargs['blog_slug'])
+        return get_object_or_404(Article.objects.defer('blog'), slug=self.kwargs['blog_slug'])
 
     def get_serializer_class(self):
         return ArticleReadSerializer
 
     def get(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        print(serializer.data)
-        return Response({'blog': serializer.data})
-
-
-class BlogUpdateView(generics.RetrieveUpdateAPIView):
+        # only the cache key columns are loaded here, the article is serialized on a cache miss
+        try:
+            article = (Article.objects.select_related(None).prefetch_related(None)
+                       .only('id', 'slug', 'updated_on', 'comment_count', 'last_commented_on')
+                       .get(slug=self.kwargs['blog_slug']))
+        except Article.DoesNotExist:
+            return redirect_renamed_article(request, 'blog_view', self.kwargs['blog_slug'])
+        # article_read_data builds the ArticleReadSerializer output without DRF fields
+        data, cached = get_article_payload(article, lambda: article_read_data(self.get_object(), request))
+        count_article_view(request, article.id)
+        response = Response({'blog': data})
+        response['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response
+
+
+class BlogUpdateView(WallpaperUploadMixin, generics.RetrieveUpdateAPIView):
     serializer_class = ArticleSerializer
     permission_classes = [IsAuthenticated, IsOwner]
     renderer_classes = [TemplateHTMLRenderer]
@@ -156,15 +257,145 @@ class BlogUpdateView(generics.RetrieveUpdateAPIView):
         return self.update(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
-        data = super().update(request, *args, **kwargs)
-        return redirect(reverse('blog_view', kwargs={'blog_slug': self.kwargs['blog_slug']}))
+        upload_errors = self.get_upload_errors(request)
+        if upload_errors:
+            raise ValidationError(upload_errors)
+        super().update(request, *args, **kwargs)
+        # the slug changes with the name
+        return redirect(reverse('blog_view', kwargs={'blog_slug': self.article.slug}))
+
+    def perform_update(self, serializer):
+        self.article = serializer.save()
+
+
+class ArticleCommentsMixin:
+    renderer_classes = [JSONRenderer]
+    pagination_class = CommentKeysetPagination
+
+    def get_queryset(self):
+        article = get_object_or_404(Article.objects.select_related(None).prefetch_related(None).only('id'),
+                                    slug=self.kwargs['blog_slug'])
+        return Comment.objects.filter(article_id=article.id)
+
+
+class CommentListView(ArticleCommentsMixin, generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        # same output as CommentReadSerializer, built from `.values()` rows
+        page = self.paginate_queryset(self.get_queryset().values(*COMMENT_READ_VALUES))
+        return self.get_paginated_response(comment_read_data(page))
+
+
+# Read only JSON API views
+def article_state(slug):
+    # the few columns every representation of an article depends on
+    state = (Article.objects.select_related(None).prefetch_related(None).filter(slug=slug)
+             .values('id', 'updated_on', 'comment_count', 'last_commented_on').first())
+    if state is None:
+        raise Http404
+    return state
+
+
+class SparseFieldsApiMixin:
+    """`?fields=a,b` limits the serialized fields. `default_fields` is used without it."""
+
+    default_fields = None
+
+    def get_fields(self):
+        allowed = ArticleApiSerializer.Meta.fields
+        requested = [field for field in self.request.query_params.get('fields', '').split(',') if field in allowed]
+        return requested or self.default_fields or allowed
+
+    def get_serializer_context(self):
+        return dict(super().get_serializer_context(), fields=self.get_fields())
+
+    def get_article_queryset(self):
+        # the raw bodies are never served, the sanitized ones only when requested
+        fields = self.get_fields()
+        deferred = ['blog', 'intro'] + [column for field, column in ArticleApiSerializer.FIELD_COLUMNS.items()
+                                        if field not in fields]
+        return Article.objects.defer(*deferred)
+
+
+class ArticleListApiView(SparseFieldsApiMixin, generics.ListAPIView):
+    serializer_class = ArticleApiSerializer
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer]
+    pagination_class = ArticleCursorPagination
+    default_fields = [field for field in ArticleApiSerializer.Meta.fields if field != 'blog']
+
+    def get_queryset(self):
+        return self.get_article_queryset().for_sort(self.paginator.get_sort(self.request))
+
+    def get(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        etag = make_etag(request.get_full_path(), [(a.id, a.updated_on, a.comment_count) for a in page])
+        last_modified = max([a.updated_on for a in page], default=None)
+        return conditional_response(request, etag, last_modified, lambda: self.get_paginated_response(
+            self.get_serializer(page, many=True).data))
+
+
+class ArticleDetailApiView(SparseFieldsApiMixin, generics.RetrieveAPIView):
+    serializer_class = ArticleApiSerializer
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            state = article_state(self.kwargs['blog_slug'])
+        except Http404:
+            return redirect_renamed_article(request, 'api_blog', self.kwargs['blog_slug'])
+        etag = make_etag(state['id'], state['updated_on'], state['comment_count'], self.get_fields())
+        last_modified = max(filter(None, [state['updated_on'], state['last_commented_on']]))
+
+        def build():
+            article = get_object_or_404(self.get_article_queryset(), pk=state['id'])
+            return Response(self.get_serializer(article).data)
+
+        return conditional_response(request, etag, last_modified, build)
+
+
+class CommentListApiView(ArticleCommentsMixin, generics.ListAPIView):
+    serializer_class = CommentApiSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        state = article_state(self.kwargs['blog_slug'])
+        etag = make_etag(state['id'], state['comment_count'], state['last_commented_on'], request.get_full_path())
+        return conditional_response(request, etag, state['last_commented_on'] or state['updated_on'],
+                                    lambda: super(CommentListApiView, self).get(request, *args, **kwargs))
 
 
 @api_view(['POST'])
 @permission_classes((IsAuthenticated,))
+@throttle_classes((CommentThrottle,))
+@renderer_classes((JSONRenderer,))
 def submit_comment(request, blog_slug):
-    article = get_object_or_404(Article, slug=blog_slug)
-    comment = CommentWriteSerializer(data=request.data)
-    if comment.is_valid(raise_exception=True):
-        comment.save(**{'comment_by': request.user, 'article': article})
-    return redirect(reverse('blog_view', kwargs={'blog_slug': blog_slug}))
+    """Forms are redirected back to the article. AJAX requests get the comment and its rendered `<li>` instead, so the
+    page only adds the new comment. With BLOG_COMMENTS_WRITE_BEHIND the comment is queued for a batch insert and the
+    answer is 202 Accepted, unless the queue is full."""
+    article_id = get_object_or_404(
+        Article.objects.select_related(None).prefetch_related(None).values_list('id', flat=True), slug=blog_slug
+    )
+    serializer = CommentWriteSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    queued = False
+    if settings.BLOG_COMMENTS_WRITE_BEHIND:
+        comment = Comment(comment_by=request.user, article_id=article_id, created_on=timezone.now(),
+                          **serializer.validated_data)
+        # a full queue means the writes fall behind, the comment is written right away then
+        queued = comment_queue.add(comment, blog_slug)
+    if queued:
+        status = 202
+    else:
+        # the comment and the comment count of its article are written together
+        with transaction.atomic():
+            comment = serializer.save(comment_by=request.user, article_id=article_id)
+        status = 201
+
+    if not request.is_ajax():
+        return redirect(reverse('blog_view', kwargs={'blog_slug': blog_slug}))
+    data = CommentReadSerializer(comment).data
+    data['html'] = render_to_string('blogs/comment.html', {'comment': data}, request)
+    return Response(data, status=status)
@@ -0,0 +1,23 @@
+"""
+ASGI config for django_blog project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. Run it with any ASGI server, e.g.
+
+    uvicorn config.asgi:application --workers 4
+    daphne config.asgi:application
+
+Django 2.2 has no ASGI support, modules.asgi.ASGIHandler serves the project: slow clients are sent to and received
+from on the event loop, views run in a pool of BLOG_ASGI_THREADS threads.
+"""
+
+import os
+
+import django
+from django.conf import settings
+
+from modules.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.production')
+django.setup(set_prefix=False)
+
+application = ASGIHandler(max_workers=settings.BLOG_ASGI_THREADS)
@@ -0,0 +1,300 @@
+"""
+Django settings for django_blog project, shared by every profile. config.settings.development adds the debug tools,
+config.settings.production is what the site is deployed with.
+
+Generated by 'django-admin startproject' using Django 2.2.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+
+from modules.database import database_config
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'g$%9#vq+f9om!q*c2x$o5w^+z*61$=#77rmyr^4t&o_2b1gy32'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'Apps.Blog',
+    'rest_framework',
+]
+
+MIDDLEWARE = [
+    'modules.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'modules.queries.QueryBudgetMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'modules.metrics.TimedDjangoTemplates',
+        # the alias of the Django backend, which DRF and the debug toolbar look it up by
+        'NAME': 'django',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'config.wsgi.application'
+
+# REST Framework settings
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.TemplateHTMLRenderer',
+    ]
+}
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+# DATABASE_URL picks the database, e.g. postgres://blog:secret@db:5432/blog?sslmode=require (add pgbouncer=1 behind a
+# transaction pooling pgbouncer). Without it the blog runs on SQLite in WAL mode, see modules.database.
+# Connections are reused for DATABASE_CONN_MAX_AGE seconds instead of being opened for every request.
+
+DATABASES = {
+    'default': database_config(os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'), BASE_DIR,
+                               conn_max_age=int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Private to each process, which only suits a single process server. The production settings use memcached.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django_blog',
+    }
+}
+
+# Sessions, picked with DJANGO_SESSION_ENGINE:
+#   db              every request with a session cookie reads its session from the database
+#   cached_db       reads come from the cache, writes go to both. Needs a cache shared by all processes (memcached,
+#                   redis): with locmem a logout in one process leaves the session alive in the others
+#   signed_cookies  the session is the cookie, signed with SECRET_KEY, and no store is queried at all. A session
+#                   can't be ended on the server, a copied cookie stays valid until SESSION_COOKIE_AGE
+# `manage.py benchmark_sessions` compares them.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('DJANGO_SESSION_ENGINE', 'db')]
+
+# Token bucket rate limits of the write endpoints, per logged in user and per client address. 'N/period' lets N
+# requests through at once and refills N tokens per period (s, m, h or d). The buckets live in the default cache,
+# which has to increment atomically: locmem, memcached and redis do, the database and file caches don't. It must also
+# be shared by all processes, with locmem every worker grants the full rate.
+BLOG_THROTTLE_RATES = {
+    'comment': {'user': '10/m', 'ip': '30/m'},
+    'article': {'user': '10/h', 'ip': '30/h'},
+    'signup': {'ip': '5/h'},
+}
+
+# Seconds a serialized article stays cached. Also bounds how stale the "x minutes ago" of its comments can get.
+BLOG_ARTICLE_CACHE_TIMEOUT = 60 * 5
+
+# Comments embedded in an article page and returned per page by the comment list endpoint
+BLOG_COMMENTS_PAGE_SIZE = 20
+
+# With BLOG_COMMENTS_WRITE_BEHIND new comments are queued and inserted in batches by a background thread of every
+# worker, once BLOG_COMMENTS_WRITE_BATCH_SIZE are waiting or after BLOG_COMMENTS_WRITE_INTERVAL seconds. A queued
+# comment shows up on the article page after its batch is written. A batch the database refuses is retried
+# BLOG_COMMENTS_WRITE_RETRIES times, and past BLOG_COMMENTS_WRITE_MAX_PENDING queued comments new ones are written at
+# once instead.
+BLOG_COMMENTS_WRITE_BEHIND = False
+BLOG_COMMENTS_WRITE_BATCH_SIZE = 100
+BLOG_COMMENTS_WRITE_INTERVAL = 2
+BLOG_COMMENTS_WRITE_RETRIES = 5
+BLOG_COMMENTS_WRITE_MAX_PENDING = 10000
+
+# Article views are buffered in every worker and written once this many are pending or this many seconds passed.
+# A viewer is counted once per article within BLOG_VIEWS_DEDUP_TIMEOUT seconds.
+BLOG_VIEWS_FLUSH_THRESHOLD = 100
+BLOG_VIEWS_FLUSH_INTERVAL = 30
+BLOG_VIEWS_DEDUP_TIMEOUT = 60 * 30
+
+# Article search backend: 'fts5' (SQLite full text search), 'inverted' (index table, any database) or 'auto' to use
+# fts5 on SQLite and the inverted index elsewhere
+BLOG_SEARCH_BACKEND = 'auto'
+BLOG_SEARCH_PAGE_SIZE = 10
+
+# Seconds category pages and the category sidebar stay cached. Both are also dropped when their articles change.
+BLOG_CATEGORY_CACHE_TIMEOUT = 60 * 10
+
+# RSS/Atom feeds list the newest BLOG_FEED_SIZE articles. Every rendered feed item is cached, keyed by the time its
+# article was updated. Sitemap pages hold the articles of BLOG_SITEMAP_PAGE_SIZE consecutive ids (at most 50000).
+BLOG_FEED_TITLE = 'Django Blog'
+BLOG_FEED_SIZE = 20
+BLOG_FEED_CACHE_TIMEOUT = 60 * 60 * 24
+BLOG_SITEMAP_PAGE_SIZE = 5000
+
+# Resized copies of article wallpapers, generated by a pool of worker threads after upload
+BLOG_WALLPAPER_RENDITION_WIDTHS = (320, 640, 1280)
+BLOG_WALLPAPER_RENDITION_FORMATS = ('webp', 'jpeg')
+BLOG_WALLPAPER_RENDITION_QUALITY = 80
+BLOG_WALLPAPER_RENDITION_WORKERS = 2
+BLOG_WALLPAPER_RENDITIONS_ASYNC = True
+
+# Wallpaper uploads over this many bytes or pixels are rejected while streaming. Only the first
+# BLOG_WALLPAPER_HEADER_SIZE bytes are used to read the image format and dimensions.
+BLOG_WALLPAPER_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+BLOG_WALLPAPER_MAX_PIXELS = 40 * 1000 * 1000
+BLOG_WALLPAPER_HEADER_SIZE = 256 * 1024
+
+# HTML whitelist article bodies are sanitized with when they are saved. Bump BLOG_HTML_VERSION after changing it and
+# run `manage.py rerender_articles` to sanitize the stored articles again.
+BLOG_HTML_VERSION = 2
+BLOG_ALLOWED_TAGS = [
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'h1', 'h2', 'h3', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'span',
+    'strong', 'sub', 'sup', 'u', 'ul',
+]
+BLOG_ALLOWED_ATTRIBUTES = {
+    '*': ['class'],
+    'a': ['href', 'title', 'target', 'rel'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'pre': ['class', 'spellcheck'],
+}
+BLOG_ALLOWED_STYLES = []
+BLOG_ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+# data: URIs are only kept as the src of an <img> of these types. Anywhere else, e.g. a link to data:text/html, they
+# would run a page of the author's choosing.
+BLOG_ALLOWED_IMAGE_DATA_TYPES = ['image/png', 'image/jpeg', 'image/gif', 'image/webp']
+
+# Requests running more queries than this, or any duplicate query, are logged as warnings on the `blog.queries`
+# logger. BLOG_QUERY_HEADERS also adds the query count, SQL time and duplicates as X-Query-* response headers.
+BLOG_QUERY_BUDGET = 20
+BLOG_QUERY_HEADERS = False
+
+# Prometheus metrics (request latency, response sizes, queries, template render time and cache hits, per view) are
+# served on /metrics. Every process counts its own requests. With BLOG_METRICS_DIR (DJANGO_METRICS_DIR) each one writes
+# its totals to a file there every BLOG_METRICS_FLUSH_INTERVAL seconds and /metrics adds up the files of all processes,
+# e.g. of every gunicorn worker. Empty the directory before the server starts.
+#
+# With BLOG_METRICS_TOKEN (DJANGO_METRICS_TOKEN) only requests sending `Authorization: Bearer <token>` get the metrics.
+# Without it they go to the addresses of BLOG_METRICS_ALLOWED_IPS, and behind a proxy on the same host every request
+# comes from 127.0.0.1: the proxy must then refuse /metrics itself.
+BLOG_METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR') or None
+BLOG_METRICS_FLUSH_INTERVAL = 5
+BLOG_METRICS_TOKEN = os.environ.get('DJANGO_METRICS_TOKEN') or None
+BLOG_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'blog.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    #{
+    #    'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    #},
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+# Auth settings
+LOGIN_REDIRECT_URL = '/'
+
+# Static files (CSS, JavaScript, Images)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+STATIC_URL = '/static/'
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# Threads of every ASGI process (config.asgi) running views, each one holds a database connection.
+BLOG_ASGI_THREADS = 8
+
+# Production only, see config.settings.production
+BLOG_PRODUCTION = False
+BLOG_SERVE_STATIC = False
+BLOG_STATIC_MAX_AGE = 60 * 60 * 24 * 365
+
+
+STATICFILES_FINDERS = (
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+)
+
+STATICFILES_DIRS = (
+    os.path.join(BASE_DIR, 'static'),
+)
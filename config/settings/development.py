@@ -0,0 +1,20 @@
+"""
+Settings for working on the blog locally: debug pages, the debug toolbar and query headers on every response.
+"""
+
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
+
+INSTALLED_APPS += [
+    'debug_toolbar',
+]
+
+MIDDLEWARE = ['debug_toolbar.middleware.DebugToolbarMiddleware'] + MIDDLEWARE
+
+# Debug toolbar
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+BLOG_QUERY_HEADERS = True
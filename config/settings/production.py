@@ -0,0 +1,66 @@
+"""
+Settings the blog is deployed with. Everything secret or host specific comes from the environment:
+
+    DJANGO_SECRET_KEY       required
+    DJANGO_ALLOWED_HOSTS    comma separated host names
+    DJANGO_STATIC_ROOT      where `collectstatic` puts the static files, <project>/staticfiles by default
+    DJANGO_SERVE_STATIC     1 to let Django serve them when no web server sits in front of it
+    DATABASE_URL            see config.settings.base
+    DJANGO_SESSION_ENGINE   db, cached_db or signed_cookies, see config.settings.base
+    DJANGO_MEMCACHED        comma separated host:port of the memcached servers, 127.0.0.1:11211 by default
+    DJANGO_METRICS_DIR      directory the worker processes share their metrics through, see config.settings.base
+    DJANGO_METRICS_TOKEN    bearer token of the metrics scraper. Without it the proxy in front must block /metrics,
+                            see config.settings.base
+
+No debug app or middleware is installed. modules.checks refuses to start when one is.
+"""
+
+import os
+
+from .base import *  # noqa: F401,F403
+
+DEBUG = False
+BLOG_PRODUCTION = True
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# One cache for all worker processes: a write handled by one worker must drop the cached articles, category pages and
+# sidebar of every other, and the rate limit buckets only count all the requests of a client when they are shared.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': [server.strip() for server in os.environ.get('DJANGO_MEMCACHED', '127.0.0.1:11211').split(',')
+                     if server.strip()],
+        'KEY_PREFIX': 'blog',
+    }
+}
+
+# Responses are compressed, and get an ETag so an unchanged page is answered with 304 Not Modified. The views that
+# know their freshness (modules.http.conditional_response) answer before rendering anything. Both sit inside the
+# metrics middleware, which so sees the compressed sizes.
+MIDDLEWARE = MIDDLEWARE[:2] + [
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+] + MIDDLEWARE[2:]
+
+# Templates are compiled once per process
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+    if processor != 'django.template.context_processors.debug'
+]
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Static file names carry a hash of their content, so they can be cached for a year. Run `manage.py collectstatic`
+# on every deploy. The web server in front of Django should serve STATIC_ROOT with the same far future headers
+# modules.http.serve_static sends.
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+BLOG_SERVE_STATIC = os.environ.get('DJANGO_SERVE_STATIC') == '1'
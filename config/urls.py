@@ -16,15 +16,24 @@ Including another URLconf
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.conf import settings
-from django.urls import path
+from django.urls import path, re_path
 from django.urls.conf import include
 
+from modules.http import serve_static
+from modules.metrics import metrics_view
+
 urlpatterns = [
                   path('admin/', admin.site.urls),
+                  path('metrics', metrics_view, name='metrics'),
                   path('', include('Apps.Blog.urls')),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-if settings.DEBUG:
+if settings.BLOG_SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
+
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     import debug_toolbar
 
     urlpatterns = [
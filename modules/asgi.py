@@ -0,0 +1,155 @@
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+
+# request bodies larger than this are spooled to a temporary file while they are received
+BODY_SPOOL_SIZE = 1024 * 1024
+
+# chunks of a streaming response read ahead of the client
+STREAM_BUFFER = 8
+
+
+class ASGIHandler:
+    """ASGI 3 application serving Django 2.2, which has no ASGI support of its own.
+
+    Everything a slow client makes a sync worker wait for happens on the event loop: receiving the request body and
+    sending the response. Only the view itself, with its ORM queries, runs in a thread, taken from a pool of
+    `max_workers` threads, so at most that many database connections are in use by the process. The threads keep their
+    connection for CONN_MAX_AGE seconds like sync workers do. A streaming response (feeds, sitemaps) keeps its thread
+    while it is sent: it is read by the thread that ran its view, at most STREAM_BUFFER chunks ahead of the client, and
+    closed by it."""
+
+    def __init__(self, max_workers):
+        self.wsgi_handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type %r' % scope['type'])
+
+        body = await self.read_body(receive)
+        if body is None:
+            # the client went away before sending the whole request
+            return
+        loop = asyncio.get_event_loop()
+        messages = asyncio.Queue(maxsize=STREAM_BUFFER)
+        stop = threading.Event()
+        task = loop.run_in_executor(self.executor, self.respond, scope, body, loop, messages, stop)
+        finished = False
+        try:
+            while True:
+                message = await messages.get()
+                if message is None:
+                    finished = True
+                    break
+                await send(message)
+        finally:
+            if not finished:
+                # sending failed: the thread stops after its current chunk and still closes the response
+                stop.set()
+                while await messages.get() is not None:
+                    pass
+            await task
+
+    def respond(self, scope, body, loop, messages, stop):
+        """Run the view, read its response and close it, all on this thread: the database connection Django gives the
+        request belongs to the thread that opened it. The ASGI messages go to the event loop through `messages`, the
+        last one is None."""
+        def put(message):
+            # waits while the queue is full, so a slow client holds back a stream instead of having it buffered
+            asyncio.run_coroutine_threadsafe(messages.put(message), loop).result()
+
+        response = None
+        try:
+            try:
+                status, headers, response = self.get_response(scope, body)
+            finally:
+                body.close()
+            put({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if response.streaming:
+                for chunk in response:
+                    if stop.is_set():
+                        return
+                    if chunk:
+                        put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                put({'type': 'http.response.body', 'body': b''})
+            else:
+                put({'type': 'http.response.body', 'body': response.content})
+        finally:
+            # closing the response sends request_finished, which returns the database connection of the thread
+            if response is not None:
+                response.close()
+            put(None)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    def get_response(self, scope, body):
+        status_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            status_headers[:] = [status, headers]
+
+        response = self.wsgi_handler(self.get_environ(scope, body), start_response)
+        status, headers = status_headers
+        # Django writes cookies with a leading space, which ASGI servers reject
+        headers = [(name.lower().encode('latin1'), value.strip().encode('latin1')) for name, value in headers]
+        return int(status.split(' ', 1)[0]), headers, response
+
+    def get_environ(self, scope, body):
+        """The WSGI environ of the request of `scope`."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # WSGI paths are the request bytes decoded as latin1
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1] or 80),
+            'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin1').upper().replace('-', '_')
+            value = value.decode('latin1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            # repeated headers are joined, like a WSGI server does
+            environ[name] = '%s,%s' % (environ[name], value) if name in environ else value
+        return environ
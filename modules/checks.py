@@ -0,0 +1,53 @@
+import sys
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.exceptions import ImproperlyConfigured
+
+DEV_APPS = ['debug_toolbar']
+DEV_MIDDLEWARE = ['debug_toolbar.middleware.DebugToolbarMiddleware']
+DEV_CONTEXT_PROCESSORS = ['django.template.context_processors.debug']
+PROCESS_CACHES = ['django.core.cache.backends.locmem.LocMemCache']
+CACHED_SESSION_ENGINES = ['django.contrib.sessions.backends.cache', 'django.contrib.sessions.backends.cached_db']
+
+
+@register(Tags.compatibility)
+def check_production_settings(app_configs, **kwargs):
+    """With the production profile, fail when a development only app, middleware or setting made it in."""
+    if not settings.BLOG_PRODUCTION:
+        return []
+
+    errors = []
+    if settings.DEBUG:
+        errors.append(Error('DEBUG is on in production.', id='blog.E001'))
+    for app in DEV_APPS:
+        if app in settings.INSTALLED_APPS or app in sys.modules:
+            errors.append(Error('%s is loaded in production.' % app, id='blog.E002'))
+    for middleware in DEV_MIDDLEWARE:
+        if middleware in settings.MIDDLEWARE:
+            errors.append(Error('%s is installed in production.' % middleware, id='blog.E003'))
+    for template in settings.TEMPLATES:
+        for processor in template.get('OPTIONS', {}).get('context_processors', []):
+            if processor in DEV_CONTEXT_PROCESSORS:
+                errors.append(Error('%s is installed in production.' % processor, id='blog.E004'))
+    if 'Manifest' not in settings.STATICFILES_STORAGE:
+        errors.append(Error('Static files are not stored with hashed names in production.',
+                            hint='Use ManifestStaticFilesStorage.', id='blog.E005'))
+    session_cache = settings.CACHES[settings.SESSION_CACHE_ALIAS]
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and session_cache['BACKEND'].endswith('LocMemCache'):
+        errors.append(Error('Sessions are cached in the memory of every process, a logout only ends the session in '
+                            'one of them.', hint='Use a shared cache (memcached, redis) or another SESSION_ENGINE.',
+                            id='blog.E006'))
+    if settings.CACHES['default']['BACKEND'] in PROCESS_CACHES:
+        errors.append(Error('The cache is private to every process: the other workers keep serving the category pages '
+                            'and sidebar one of them invalidated, and every worker grants a client the full rate '
+                            'limit.', hint='Use a shared cache (memcached, redis).', id='blog.E007'))
+    return errors
+
+
+def assert_production_ready():
+    """Run at startup, so a misconfigured production process stops before serving anything. `manage.py check` reports
+    the same errors."""
+    errors = check_production_settings(None)
+    if errors:
+        raise ImproperlyConfigured('\n'.join(str(error) for error in errors))
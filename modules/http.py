@@ -0,0 +1,37 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.static import serve
+
+# ManifestStaticFilesStorage names files <name>.<first 12 hex digits of the md5 of their content>.<extension>
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+def make_etag(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_response(request, etag, last_modified, build):
+    """Answer a conditional GET with 304 Not Modified before `build()` renders anything. The response `build()` returns
+    gets the ETag and Last-Modified headers."""
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def serve_static(request, path):
+    """Serve a collected static file. Hashed file names change with their content, so those are cached for
+    BLOG_STATIC_MAX_AGE seconds and never revalidated."""
+    response = serve(request, path, document_root=settings.STATIC_ROOT)
+    if HASHED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=settings.BLOG_STATIC_MAX_AGE, immutable=True)
+    return response
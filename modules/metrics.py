@@ -0,0 +1,267 @@
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'blog_http_requests_total': ('counter', 'Requests answered, per view, method and status.', None),
+    'blog_http_request_duration_seconds': ('histogram', 'Seconds spent answering a request, per view and method.',
+                                           LATENCY_BUCKETS),
+    'blog_http_response_size_bytes': ('histogram', 'Body size of the non streaming responses, per view.',
+                                      SIZE_BUCKETS),
+    'blog_db_queries_per_request': ('histogram', 'Database queries run by a request, per view.', QUERY_BUCKETS),
+    'blog_db_query_duration_seconds_total': ('counter', 'Seconds spent running queries, per view.', None),
+    'blog_template_render_duration_seconds': ('histogram', 'Seconds spent rendering a template, per template.',
+                                              LATENCY_BUCKETS),
+    'blog_cache_requests_total': ('counter', 'Cache lookups, per cached object and result (hit or miss).', None),
+    'blog_throttled_requests_total': ('counter', 'Requests refused by a rate limit, per scope.', None),
+}
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def series_key(name, labels):
+    return name, tuple(sorted((label, str(label_value)) for label, label_value in labels.items()))
+
+
+class MetricsRegistry:
+    """Counters and histograms of one process.
+
+    A process only sees its own requests, and a gunicorn worker serves a share of them. With a `directory`, every
+    process writes a snapshot of its metrics to <directory>/<pid>.json, at most every `interval` seconds and when it
+    exits, and collect() adds up the snapshots of all processes. Series are kept as totals since the process started,
+    so a snapshot replaces the previous one of its process and a process that exits leaves its final totals behind,
+    keeping the sums from going down."""
+
+    def __init__(self, directory=None, interval=5):
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        # (name, labels): value
+        self._counters = {}
+        # (name, labels): [count per bucket, then above the last bucket], sum
+        self._histograms = {}
+        self._last_flush = time.monotonic()
+
+    def inc(self, name, amount=1, **labels):
+        key = series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = series_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0]
+            histogram[0][next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, labels, list(counts), total]
+                               for (name, labels), (counts, total) in self._histograms.items()],
+            }
+
+    def flush_if_due(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        snapshot = self.snapshot()
+        try:
+            # written next to the final file and renamed over it, so readers never see half a snapshot
+            descriptor, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(snapshot, file)
+            os.replace(path, os.path.join(self.directory, '%s.json' % os.getpid()))
+        except OSError:
+            logger.exception('Could not write the metrics of process %s to %s', os.getpid(), self.directory)
+
+    def collect(self):
+        """The metrics of every process, or only of this one without a directory, as one snapshot."""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                logger.warning('Skipping the unreadable metrics file %s', path, exc_info=True)
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms and len(histograms[key][0]) == len(counts):
+                histograms[key] = [[a + b for a, b in zip(histograms[key][0], counts)], histograms[key][1] + total]
+            else:
+                histograms[key] = [list(counts), total]
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, counts, total] for (name, labels), (counts, total) in histograms.items()],
+    }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (label, str(value).replace('\\', r'\\').replace('\n', r'\n')
+                                          .replace('"', r'\"')) for label, value in labels)
+
+
+def format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """`snapshot` in the Prometheus text exposition format."""
+    series = {}
+    for name, labels, value in snapshot['counters']:
+        series.setdefault(name, []).append((labels, ['%s%s %s' % (name, format_labels(labels), format_value(value))]))
+    for name, labels, counts, total in snapshot['histograms']:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(METRICS[name][2] + (math.inf,), counts):
+            cumulative += count
+            le = format_value(float(bound))
+            lines.append('%s_bucket%s %s' % (name, format_labels(list(labels) + [('le', le)]), cumulative))
+        lines.append('%s_sum%s %s' % (name, format_labels(labels), format_value(float(total))))
+        lines.append('%s_count%s %s' % (name, format_labels(labels), cumulative))
+        series.setdefault(name, []).append((labels, lines))
+
+    # the hit ratio of every cache, derived from the lookup counters
+    lookups = {}
+    for name, labels, value in snapshot['counters']:
+        if name == 'blog_cache_requests_total':
+            labels = dict(map(tuple, labels))
+            lookups.setdefault(labels['cache'], {}).setdefault(labels['result'], 0)
+            lookups[labels['cache']][labels['result']] += value
+    ratios = ['blog_cache_hit_ratio%s %s' % (format_labels([('cache', cache)]),
+                                             format_value(results.get('hit', 0) / sum(results.values())))
+              for cache, results in sorted(lookups.items()) if sum(results.values())]
+
+    output = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name in series:
+            output += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+            for labels, lines in sorted(series[name], key=lambda labelled: [list(label) for label in labelled[0]]):
+                output += lines
+    if ratios:
+        output += ['# HELP blog_cache_hit_ratio Share of the cache lookups that were hits, per cached object.',
+                   '# TYPE blog_cache_hit_ratio gauge'] + ratios
+    return '\n'.join(output) + '\n'
+
+
+metrics = MetricsRegistry(settings.BLOG_METRICS_DIR, settings.BLOG_METRICS_FLUSH_INTERVAL)
+atexit.register(metrics.flush)
+
+
+class MetricsMiddleware:
+    """Count every request and observe its latency, response size and database queries, labelled with the name of
+    the URL pattern it matched. Installed first, so the latency covers all the other middleware. The query count is
+    the one QueryBudgetMiddleware measured."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # URL names keep the number of series bounded, unlike paths
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        metrics.inc('blog_http_requests_total', view=view, method=method, status=response.status_code)
+        metrics.observe('blog_http_request_duration_seconds', duration, view=view, method=method)
+        if not response.streaming:
+            metrics.observe('blog_http_response_size_bytes', len(response.content), view=view)
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None:
+            metrics.observe('blog_db_queries_per_request', budget.count, view=view)
+            metrics.inc('blog_db_query_duration_seconds_total', budget.duration, view=view)
+        metrics.flush_if_due()
+        return response
+
+
+class TimedTemplate:
+    """A template of the Django backend, timing its renders."""
+
+    def __init__(self, template, name):
+        self.template = template
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self.template, attribute)
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.observe('blog_template_render_duration_seconds', time.perf_counter() - start,
+                            template=self.name)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, observing the render time of every template it loads."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code), '<string>')
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name), template_name)
+
+
+def scraper_allowed(request):
+    if settings.BLOG_METRICS_TOKEN:
+        return constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''),
+                                     'Bearer %s' % settings.BLOG_METRICS_TOKEN)
+    return request.META.get('REMOTE_ADDR') in settings.BLOG_METRICS_ALLOWED_IPS
+
+
+@require_safe
+def metrics_view(request):
+    """The metrics of all processes in the Prometheus text format, for the scraper holding BLOG_METRICS_TOKEN or,
+    without a token, the ones of BLOG_METRICS_ALLOWED_IPS."""
+    if not scraper_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(metrics.collect()), content_type=CONTENT_TYPE)
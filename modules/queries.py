@@ -0,0 +1,88 @@
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('blog.queries')
+
+
+class QueryBudget:
+    """Context manager recording every query run on `using` while it is open: how many, how long they took in total
+    and how many were repeats of an earlier query with the same SQL and parameters.
+
+    Unlike CaptureQueriesContext it doesn't need DEBUG, so it is cheap enough to wrap every request in production."""
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql, repr(params)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    @property
+    def similar(self):
+        """Queries sharing their SQL with an earlier one but not necessarily the parameters, the shape of an N+1."""
+        per_sql = Counter()
+        for (sql, params), count in self.statements.items():
+            per_sql[sql] += count
+        return sum(count - 1 for count in per_sql.values())
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'sql_time_ms': round(self.duration * 1000, 2),
+            'duplicates': self.duplicates,
+            'similar': self.similar,
+        }
+
+
+class QueryBudgetMiddleware:
+    """Measure the queries every request runs.
+
+    The totals go to the `blog.queries` logger as structured `extra` data, at WARNING when the request ran more than
+    BLOG_QUERY_BUDGET queries or any duplicate query. With BLOG_QUERY_HEADERS they are also sent as X-Query-* response
+    headers."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryBudget() as budget:
+            # read by modules.metrics.MetricsMiddleware
+            request.query_budget = budget
+            response = self.get_response(request)
+        stats = budget.as_dict()
+
+        over_budget = budget.count > settings.BLOG_QUERY_BUDGET or budget.duplicates
+        logger.log(logging.WARNING if over_budget else logging.DEBUG,
+                   '%s %s ran %d queries in %.2fms (%d duplicate, %d similar)', request.method, request.path,
+                   budget.count, stats['sql_time_ms'], budget.duplicates, budget.similar,
+                   extra=dict(stats, method=request.method, path=request.path, status=response.status_code))
+
+        if settings.BLOG_QUERY_HEADERS:
+            response['X-Query-Count'] = stats['queries']
+            response['X-Query-Time'] = '%.2f' % stats['sql_time_ms']
+            response['X-Query-Duplicates'] = stats['duplicates']
+        return response
@@ -0,0 +1,62 @@
+import math
+import time
+
+from django.core.cache import cache as default_cache
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """'10/m' (or '10/min', '10/minute') is (10, 60): ten requests at once and ten more every 60 seconds."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucket:
+    """Token bucket of `capacity` tokens refilled at `capacity` tokens per `period` seconds, kept in a cache.
+
+    The bucket is stored as a single integer, the time in milliseconds at which it will be full again (the
+    "theoretical arrival time" of GCRA). Taking a token adds the refill time of one token to it with cache.incr, and
+    the token was available when that time is at most a full bucket of refill time ahead of now. So taking a token
+    is one atomic increment, whatever the number of concurrent workers, and an idle bucket simply expires. The cache
+    must increment atomically, which locmem, memcached and redis do and the database and file caches don't.
+
+    When the stored time is in the past the bucket is full and the time is moved up to now. Two requests doing that
+    at the same moment both move it, which only makes the bucket stricter for a moment."""
+
+    def __init__(self, capacity, period, cache=None):
+        self.capacity = capacity
+        # milliseconds refilling one token
+        self.interval = max(1, int(period * 1000 / capacity))
+        self.tolerance = self.interval * capacity
+        self.timeout = math.ceil(self.tolerance / 1000) + 1
+        self.cache = cache or default_cache
+
+    def take(self, key, now=None):
+        """Take a token from the bucket `key`. Returns 0 when one was available, else the seconds until one is."""
+        now = int((time.time() if now is None else now) * 1000)
+        if self.cache.add(key, now + self.interval, self.timeout):
+            return 0
+        try:
+            full_at = self.cache.incr(key, self.interval)
+        except ValueError:
+            # expired since add()
+            self.cache.add(key, now + self.interval, self.timeout)
+            return 0
+        if full_at - self.interval < now:
+            full_at = self.cache.incr(key, now - (full_at - self.interval))
+        if full_at - now > self.tolerance:
+            # a refused request takes no token
+            self.cache.decr(key, self.interval)
+            return (full_at - now - self.tolerance) / 1000
+        # the bucket must not expire before it is full again
+        self.cache.touch(key, self.timeout)
+        return 0
+
+    def refund(self, key):
+        """Put back a token take() gave, e.g. when another bucket refused the request after all."""
+        try:
+            self.cache.decr(key, self.interval)
+        except ValueError:
+            # expired meanwhile, so full anyway
+            pass
@@ -0,0 +1,23 @@
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+from .utils import CONTENT_HASH_NAME
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps one copy of files named after a hash of their content. An existing hash name
+    holds the same content, so it is reused instead of written again. Other names get the usual unique suffix."""
+
+    def is_content_addressed(self, name):
+        return bool(CONTENT_HASH_NAME.match(os.path.basename(name)))
+
+    def get_available_name(self, name, max_length=None):
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if self.is_content_addressed(name) and self.exists(name):
+            return name
+        return super()._save(name, content)
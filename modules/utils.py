@@ -1,7 +1,22 @@
-import datetime
+import math
+import os
+import re
+import secrets
+import string
+from functools import lru_cache
+from html import unescape
 
-from django.template.defaultfilters import truncatewords
-from django.utils.text import slugify
+import bleach
+from django.conf import settings
+from django.utils.html import strip_tags
+from django.utils.text import Truncator, slugify
+
+CONTENT_HASH_NAME = re.compile(r'^[0-9a-f]{64}\.\w+$')
+
+# random slug suffixes: 36^6, about two billion per title
+SLUG_SUFFIX_ALPHABET = string.ascii_lowercase + string.digits
+SLUG_SUFFIX_LENGTH = 6
+SLUG_CANDIDATES = 5
 
 
 def create_slug(content, post_fix=None):
@@ -10,15 +25,85 @@ def create_slug(content, post_fix=None):
     return slugify(content)
 
 
+def slug_candidates(content, max_length=50, count=SLUG_CANDIDATES):
+    """`content` slugified and cut to `max_length` on a word boundary, followed by variants ending in a short random
+    suffix, e.g. ['hello-world', 'hello-world-x7k2qa', ...]."""
+    base = slugify(content)
+    limit = max_length - SLUG_SUFFIX_LENGTH - 1
+    if len(base) > limit:
+        base = base[:limit + 1].rsplit('-', 1)[0] if '-' in base[:limit] else base[:limit]
+    suffixes = [''.join(secrets.choice(SLUG_SUFFIX_ALPHABET) for _ in range(SLUG_SUFFIX_LENGTH))
+                for _ in range(count - 1)]
+    if not base:
+        return suffixes
+    return [base] + ['%s-%s' % (base, suffix) for suffix in suffixes]
+
+
+def unique_slug(content, taken, max_length=50):
+    """The first candidate of `slug_candidates` that is free. `taken(candidates)` returns the ones already in use, so
+    all of them are checked against the index in one query."""
+    while True:
+        candidates = slug_candidates(content, max_length)
+        used = set(taken(candidates))
+        for candidate in candidates:
+            if candidate not in used:
+                return candidate
+        # only when the title and every random suffix were in use, which practically never happens
+
+
 def generate_upload_path(instance, filename):
-    # file will be uploaded to MEDIA_ROOT/Article/article_<id>/<filename>
-    model_name = ''
-    if len(filename) > 100:
-        filename = datetime.datetime.now().__str__()
-    try:
-        model_name = str(instance._meta.db_table).lower()
-    except Exception as e:
-        print(e)
-        model_name = 'EE'
-    return 'Article/article_{0} {1}/{2}/{3}'.format(instance.id, truncatewords(instance.slug, 10), model_name,
-                                                              filename)
+    # files named after the sha256 of their content (see WallpaperUploadHandler) are uploaded to
+    # MEDIA_ROOT/<table>/<hash[:2]>/<hash[2:4]>/<hash>.<ext>, so the same image is stored once. Other files are
+    # uploaded to MEDIA_ROOT/<table>/article_<id>-<slug>/<filename>
+    model_name = str(instance._meta.db_table).lower()
+    if CONTENT_HASH_NAME.match(filename):
+        return '{0}/{1}/{2}/{3}'.format(model_name, filename[:2], filename[2:4], filename)
+    name, extension = os.path.splitext(filename)
+    return '{0}/article_{1}-{2}/{3}{4}'.format(model_name, instance.id or 'new', slugify(instance.slug)[:50],
+                                               slugify(name)[:100] or 'file', extension.lower())
+
+
+def content_stats(content):
+    # word count, image count and read time of an html body. Read time is 250 words a minute and 6 seconds per
+    # image, never less than a minute
+    content = content or ''
+    word_count = len(strip_tags(content).split())
+    image_count = content.count('<img')
+    time_taken = (word_count / 250) + (image_count / 10)
+    return word_count, image_count, max(math.ceil(time_taken), 1)
+
+
+def reading_time(content):
+    return content_stats(content)[2]
+
+
+# characters browsers ignore in a URI scheme, the same ones bleach strips before checking the protocol
+URI_IGNORED_CHARACTERS = re.compile(r'[`\x00-\x20\x7f-\xa0\s]+')
+
+
+def _allowed_attribute(tag, name, value):
+    allowed = settings.BLOG_ALLOWED_ATTRIBUTES
+    if name not in allowed.get(tag, ()) and name not in allowed.get('*', ()):
+        return False
+    uri = URI_IGNORED_CHARACTERS.sub('', unescape(value)).lower()
+    if uri.startswith('data:'):
+        # the protocol list applies to every attribute, data: is only allowed for inline images
+        media_type = re.split('[;,]', uri[len('data:'):], 1)[0]
+        return (tag, name) == ('img', 'src') and media_type in settings.BLOG_ALLOWED_IMAGE_DATA_TYPES
+    return True
+
+
+@lru_cache(maxsize=None)
+def _html_cleaner(version):
+    # one cleaner per whitelist version, building it parses the whitelist
+    protocols = settings.BLOG_ALLOWED_PROTOCOLS + (['data'] if settings.BLOG_ALLOWED_IMAGE_DATA_TYPES else [])
+    return bleach.sanitizer.Cleaner(tags=settings.BLOG_ALLOWED_TAGS, attributes=_allowed_attribute,
+                                    styles=settings.BLOG_ALLOWED_STYLES, protocols=protocols, strip=True)
+
+
+def sanitize_html(content):
+    return _html_cleaner(settings.BLOG_HTML_VERSION).clean(content or '')
+
+
+def html_excerpt(content, words=60):
+    return Truncator(sanitize_html(content)).words(words, html=True, truncate=' …')